@@ -0,0 +1,114 @@
+"""
+Pure-Python HTTP load generator (standard library only).
+
+Each worker thread keeps one keep-alive connection open and sends GET
+requests until the shared request budget is used up, so ``concurrency``
+is the number of requests in flight at any time.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import http.client
+import itertools
+import threading
+import time
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))  # ceil
+    return sorted_values[int(rank) - 1]
+
+
+class RouteResult:
+    """Latencies and outcomes of the requests sent to one path"""
+
+    def __init__(self, path):
+        self.path = path
+        self.latencies = []
+        self.status_codes = Counter()
+        self.errors = Counter()
+        self.bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, status=None, size=0, error=None):
+        with self._lock:
+            if error:
+                self.errors[error] += 1
+            else:
+                self.latencies.append(seconds)
+                self.status_codes[status] += 1
+                self.bytes += size
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        completed = len(latencies)
+
+        def ms(seconds):
+            return round(seconds * 1000, 2) if seconds is not None else None
+
+        return {
+            'path': self.path,
+            'requests': completed + sum(self.errors.values()),
+            'errors': sum(self.errors.values()) + sum(
+                count for status, count in self.status_codes.items() if status >= 500
+            ),
+            'status_codes': {str(status): count for status, count in sorted(self.status_codes.items())},
+            'error_types': dict(self.errors),
+            'throughput_rps': round(completed / self.seconds, 1) if self.seconds else None,
+            'latency_ms': {
+                'p50': ms(percentile(latencies, 50)),
+                'p95': ms(percentile(latencies, 95)),
+                'p99': ms(percentile(latencies, 99)),
+                'mean': ms(sum(latencies) / completed) if completed else None,
+                'max': ms(latencies[-1]) if latencies else None,
+            },
+            'bytes_per_response': self.bytes // completed if completed else None,
+        }
+
+
+def _connect(base_url, timeout):
+    url = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    return connection_class(url.hostname, url.port, timeout=timeout)
+
+
+def _worker(base_url, path, headers, remaining, result, timeout):
+    connection = _connect(base_url, timeout)
+    try:
+        while next(remaining) > 0:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                result.add(time.perf_counter() - started, error=type(e).__name__)
+                connection.close()
+                connection = _connect(base_url, timeout)
+                continue
+            result.add(time.perf_counter() - started, response.status, len(body))
+            if response.will_close:
+                connection.close()
+                connection = _connect(base_url, timeout)
+    finally:
+        connection.close()
+
+
+def run_load(base_url, path, requests, concurrency=8, headers=None, timeout=30):
+    """Send ``requests`` GETs for ``path`` with ``concurrency`` in flight; returns a RouteResult"""
+    result = RouteResult(path)
+    # count() is atomic in CPython: each worker takes the next ticket until none are left
+    tickets = itertools.count(requests, -1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [
+            executor.submit(_worker, base_url, path, headers or {}, tickets, result, timeout)
+            for worker in range(concurrency)
+        ]:
+            future.result()
+    result.seconds = time.perf_counter() - started
+    return result
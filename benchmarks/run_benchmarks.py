@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark the public routes against a local gunicorn.
+
+Everything runs in a work directory (benchmarks/.work by default) with its
+own SQLite database, media, static files and file cache, so the
+development database is never touched:
+
+1. migrate and seed a reproducible synthetic dataset with real image files
+   (manage.py seed_benchmark_data; kept between runs unless --reseed),
+2. collectstatic and start gunicorn on 127.0.0.1,
+3. for every public route: warm up, then send --requests GETs with
+   --concurrency in flight through the pure-Python load generator,
+4. print p50/p95/p99 latency and throughput per route and save them as
+   JSON (benchmarks/results/) to compare releases with --compare.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --concurrency 16 --requests 500 --workers 3
+    python benchmarks/run_benchmarks.py --bypass-page-cache   # measure rendering, not cache hits
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<earlier run>.json
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from loadgen import run_load
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+
+# Dataset sizes, passed on to seed_benchmark_data
+DATASET_OPTIONS = ('photos_per_category', 'galleries', 'images_per_gallery', 'celebrations', 'photos_per_celebration')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the public routes against a local gunicorn')
+    parser.add_argument('--work-dir', type=Path, default=BASE_DIR / 'benchmarks' / '.work')
+    parser.add_argument('--output', type=Path, help='Result file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', type=Path, help='Earlier result file to compare against')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn worker processes')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight')
+    parser.add_argument('--requests', type=int, default=300, help='Measured requests per route')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route first')
+    parser.add_argument('--accept-encoding', default='br, gzip', help='Accept-Encoding sent, like a browser')
+    parser.add_argument('--bypass-page-cache', action='store_true',
+                        help='Send a session cookie so every request renders (view data caches still apply)')
+    parser.add_argument('--paths', nargs='+', help='Only these paths (default: every public route)')
+    parser.add_argument('--reseed', action='store_true', help='Recreate the dataset')
+    parser.add_argument('--photos-per-category', type=int, default=3)
+    parser.add_argument('--galleries', type=int, default=30)
+    parser.add_argument('--images-per-gallery', type=int, default=6)
+    parser.add_argument('--celebrations', type=int, default=12)
+    parser.add_argument('--photos-per-celebration', type=int, default=4)
+    return parser.parse_args()
+
+
+def benchmark_environment(work_dir):
+    """Environment of the benchmark site, for this process and gunicorn"""
+    return {
+        'DJANGO_SETTINGS_MODULE': 'kapadiaschool.settings',
+        'SECRET_KEY': 'benchmark-only-secret-key',
+        'DEBUG': 'False',
+        'DATABASE_URL': f'sqlite:///{work_dir / "db.sqlite3"}',
+        'MEDIA_ROOT': str(work_dir / 'media'),
+        'STATIC_ROOT': str(work_dir / 'static'),
+        'SNAPSHOT_ROOT': str(work_dir / 'snapshots'),
+        'CACHE_URL': f'file://{work_dir / "cache"}',
+        'CELERY_TASK_ALWAYS_EAGER': 'True',  # Renditions are made while seeding
+        'PERFORMANCE_LOG_SAMPLE_RATE': '0',
+    }
+
+
+def prepare_site(args):
+    """Migrate, seed and collect static files; returns the dataset description and the paths to load"""
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.urls import reverse
+    from khschool.warming import SKIPPED_ROUTES
+
+    dataset_file = args.work_dir / 'dataset.json'
+    call_command('migrate', interactive=False, verbosity=0)
+    if args.reseed or not dataset_file.exists():
+        from khschool.models import BranchPhoto, CarouselImage, Celebration, Gallery
+        for model in (BranchPhoto, CarouselImage, Celebration, Gallery):
+            model.objects.all().delete()
+        dataset = {option: getattr(args, option) for option in DATASET_OPTIONS}
+        call_command('seed_benchmark_data', **dataset)
+        dataset_file.write_text(json.dumps(dataset, indent=2))
+    dataset = json.loads(dataset_file.read_text())
+    call_command('collectstatic', interactive=False, verbosity=0)
+
+    from khschool.urls import urlpatterns
+    paths = args.paths or [
+        reverse(pattern.name) for pattern in urlpatterns
+        if pattern.name and pattern.name not in SKIPPED_ROUTES
+    ]
+    return dataset, paths
+
+
+def start_gunicorn(args, env):
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'kapadiaschool.wsgi:application',
+            '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers), '--log-level', 'warning',
+        ],
+        cwd=BASE_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn exited with code {server.returncode}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{args.port}/contact/', timeout=2)
+            return server
+        except (urllib.error.URLError, socket.timeout, ConnectionError):
+            time.sleep(0.5)
+    server.terminate()
+    raise SystemExit('gunicorn did not start within 60 seconds')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_table(routes, previous=None):
+    previous = {route['path']: route for route in (previous or {}).get('routes', [])}
+    print(f'\n{"path":<40} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for route in routes:
+        latency = route['latency_ms']
+        line = (
+            f'{route["path"]:<40} {route["throughput_rps"] or 0:>8} {latency["p50"] or 0:>8} '
+            f'{latency["p95"] or 0:>8} {latency["p99"] or 0:>8} {route["errors"]:>7}'
+        )
+        before = previous.get(route['path'])
+        if before and before['latency_ms']['p95'] and latency['p95']:
+            change = (latency['p95'] - before['latency_ms']['p95']) / before['latency_ms']['p95'] * 100
+            line += f'   p95 {change:+.0f}% vs {before["latency_ms"]["p95"]} ms'
+        print(line)
+
+
+def main():
+    args = parse_args()
+    args.work_dir = args.work_dir.resolve()
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    (BASE_DIR / 'logs').mkdir(exist_ok=True)  # LOGGING writes there
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.chdir(BASE_DIR)
+    env = {**os.environ, **benchmark_environment(args.work_dir)}
+    os.environ.update(env)
+
+    print('🌱 Preparing the benchmark site...')
+    started_at = datetime.now(timezone.utc)
+    dataset, paths = prepare_site(args)
+
+    headers = {'Accept-Encoding': args.accept_encoding}
+    if args.bypass_page_cache:
+        headers['Cookie'] = 'sessionid=benchmark'
+
+    print(f'🚀 Starting gunicorn with {args.workers} workers...')
+    server = start_gunicorn(args, env)
+    base_url = f'http://127.0.0.1:{args.port}'
+    routes = []
+    try:
+        for path in paths:
+            run_load(base_url, path, args.warmup, args.concurrency, headers)
+            result = run_load(base_url, path, args.requests, args.concurrency, headers).as_dict()
+            routes.append(result)
+            print(f'   ✅ {path}: {result["throughput_rps"]} req/s, p95 {result["latency_ms"]["p95"]} ms')
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    finished_at = datetime.now(timezone.utc)
+    report = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'finished_at': finished_at.isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'accept_encoding': args.accept_encoding,
+            'bypass_page_cache': args.bypass_page_cache,
+            'dataset': dataset,
+        },
+        'routes': routes,
+    }
+
+    output = args.output or RESULTS_DIR / f'{started_at:%Y%m%d-%H%M%S}-{report["git_commit"]}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    print_table(routes, json.loads(args.compare.read_text()) if args.compare else None)
+    print(f'\n✅ Results saved to {output}')
+    if any(route['errors'] for route in routes):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
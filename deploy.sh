@@ -139,6 +139,12 @@ deploy() {
     # Collect static files
     docker-compose -f docker-compose.prod.yml exec -T web python manage.py collectstatic --noinput
     
+    # Inline the first-screen CSS of the main pages
+    docker-compose -f docker-compose.prod.yml exec -T web python manage.py build_critical_css || true
+    
+    # Warm the page cache
+    docker-compose -f docker-compose.prod.yml exec -T web python manage.py warm_cache --threads 4 || true
+    
     # Create superuser if needed
     echo -e "${YELLOW}👤 Creating admin user (optional)...${NC}"
     docker-compose -f docker-compose.prod.yml exec web python manage.py manage_admin_users --create-superuser || true
@@ -34,6 +34,18 @@ collect_static() {
     python manage.py collectstatic --noinput
 }
 
+# Function to extract the first-screen CSS of the main pages
+build_critical_css() {
+    echo "Building critical CSS..."
+    python manage.py build_critical_css || echo "Critical CSS build failed, stylesheets stay blocking"
+}
+
+# Function to render the content-free pages for nginx
+build_snapshots() {
+    echo "Building page snapshots..."
+    python manage.py build_snapshots || echo "Snapshot build failed, pages will be served by Django"
+}
+
 # Function to create superuser if it doesn't exist
 create_superuser() {
     echo "Creating superuser if it doesn't exist..."
@@ -68,6 +80,12 @@ main() {
     # Collect static files
     collect_static
     
+    # Inline the first-screen CSS (needs the collected bundles)
+    build_critical_css
+    
+    # Render static page snapshots (needs the collected static file names)
+    build_snapshots
+    
     # Create superuser
     create_superuser
     
@@ -0,0 +1,28 @@
+"""
+gunicorn settings shared by every deployment. gunicorn reads this file
+from the project folder on its own; command line flags (bind, workers,
+timeout) still apply on top.
+
+Each worker writes its Prometheus samples to PROMETHEUS_MULTIPROC_DIR so
+/metrics can add up all workers (see khschool/metrics.py).
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'kapadiaschool-metrics')
+)
+
+
+def on_starting(server):
+    """Start from empty metric files, the counters restart with the server"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited (e.g. recycled by --max-requests)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
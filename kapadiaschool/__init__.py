@@ -0,0 +1,8 @@
+try:
+    # Load the Celery app when Django starts so tasks are bound to it
+    from .celery import app as celery_app
+except ImportError:
+    # Celery is optional, khschool.tasks falls back to running in-process
+    celery_app = None
+
+__all__ = ('celery_app',)
@@ -0,0 +1,32 @@
+"""
+Celery application for kapadiaschool project.
+
+Runs background work such as image rendition generation. Started on the VPS
+by supervisor with ``celery -A kapadiaschool worker``.
+
+For more information on this file, see
+https://docs.celeryq.dev/en/stable/django/first-steps-with-django.html
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kapadiaschool.settings')
+
+app = Celery('kapadiaschool')
+
+# Read every CELERY_* setting from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+
+@app.on_after_configure.connect
+def create_broker_folders(sender, **kwargs):
+    """The filesystem broker needs its queue folders to exist before use"""
+    options = sender.conf.broker_transport_options or {}
+    for key in ('data_folder_in', 'data_folder_out', 'processed_folder', 'control_folder'):
+        if options.get(key):
+            os.makedirs(options[key], exist_ok=True)
+
+# Find tasks.py in every installed app
+app.autodiscover_tasks()
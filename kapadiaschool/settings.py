@@ -15,6 +15,7 @@ import os
 import dj_database_url
 from dotenv import load_dotenv
 from decouple import config
+from whitenoise.compress import Compressor
 
 # Load environment variables from .env file
 load_dotenv()
@@ -94,11 +95,16 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
+    # Times everything below it, cache hits included (Server-Timing header)
+    'khschool.middleware.ServerTimingMiddleware',
+    # Turns cached pages into 304s for browsers that already have them
+    'django.middleware.http.ConditionalGetMiddleware',
     # Cache middleware - add these at the top after security and whitenoise
-    'django.middleware.cache.UpdateCacheMiddleware',
+    'khschool.middleware.VersionedUpdateCacheMiddleware',
+    # Anonymous cache hits return here, before any session/auth work
+    'khschool.middleware.VersionedFetchFromCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -110,7 +116,8 @@ ROOT_URLCONF = 'kapadiaschool.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, timed per request (Server-Timing "tpl")
+        'BACKEND': 'khschool.instrumentation.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR,'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -183,7 +190,7 @@ else:
     }
 
 # Media files configuration for VPS hosting
-MEDIA_ROOT = os.path.join(BASE_DIR, 'gallery')
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'gallery'))
 MEDIA_URL = '/gallery/'
 
 # Use local file storage (recommended for VPS hosting)
@@ -234,23 +241,107 @@ STATICFILES_DIRS = [
 ]
 
 # Configure static file storage for production
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATIC_ROOT = os.environ.get('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
 
-# Enable WhiteNoise compression and caching support
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Pre-rendered content-free pages served by nginx (python manage.py build_snapshots)
+SNAPSHOT_ROOT = os.environ.get('SNAPSHOT_ROOT', os.path.join(BASE_DIR, 'snapshots'))
 
-# Cache settings for better performance
-CACHES = {
+# Enable WhiteNoise compression and caching support, plus the CSS/JS bundles
+# of khschool/assets.py and the optimized PDFs of khschool/documents.py
+# (built by collectstatic)
+STORAGES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'khschool.storage.BundledStaticFilesStorage',
+    },
 }
 
+# The PDFs are already compressed, and served as they are so that viewers
+# can fetch the pages of the linearized files in byte ranges (nginx serves
+# a .gz copy whole, WhiteNoise would cut ranges of the compressed bytes)
+WHITENOISE_SKIP_COMPRESS_EXTENSIONS = [*Compressor.SKIP_COMPRESS_EXTENSIONS, 'pdf']
+
+# Cache settings for better performance
+# One cache shared by every gunicorn worker (pages, content versions, sessions,
+# admin rate limits). CACHE_URL selects the backend:
+#   redis://localhost:6379/1  - Redis (production)
+#   file:///path/to/folder    - files on local disk, no extra service (default);
+#                               rebuild locks are lock files (khschool/caching.py)
+#   locmem://                 - per-process memory, single-process development only
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL == 'locmem://':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_URL.removeprefix('file://') or os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+# The test suite clears the cache between tests, so it runs on a private
+# in-memory one (kapadiaschool/test_settings.py; pytest reads that module)
+TEST_RUNNER = 'kapadiaschool.test_settings.TestRunner'
+
 # Cache middleware settings
-CACHE_MIDDLEWARE_SECONDS = 60 * 15  # 15 minutes
+# Model saves/deletes invalidate the affected pages (khschool/caching.py),
+# so cached pages can live for hours
+CACHE_MIDDLEWARE_SECONDS = 60 * 60 * 6  # 6 hours
+CACHE_MIDDLEWARE_BROWSER_SECONDS = 60  # browsers revalidate after a minute
 CACHE_MIDDLEWARE_KEY_PREFIX = 'kapadiaschool'
 
+# Public address of the site: the warm_cache command requests pages as
+# visitors of this host, since the host is part of the page cache key
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Request instrumentation (khschool.middleware.ServerTimingMiddleware):
+# Server-Timing header on every response, JSON lines in logs/performance.log
+# for a sample of requests and for every request slower than the threshold
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True').lower() == 'true'
+PERFORMANCE_LOG_SAMPLE_RATE = float(os.environ.get('PERFORMANCE_LOG_SAMPLE_RATE', '0.05'))
+PERFORMANCE_LOG_SLOW_MS = int(os.environ.get('PERFORMANCE_LOG_SLOW_MS', '1000'))
+
+# Bearer token of the Prometheus /metrics endpoint (disabled while empty)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Celery background tasks (image renditions, EXIF stripping, file cleanup)
+# Production should point CELERY_BROKER_URL at Redis, e.g. redis://localhost:6379/0
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'filesystem://')
+if CELERY_BROKER_URL == 'filesystem://':
+    # Local broker stand-in: the web and worker processes share a queue folder
+    CELERY_BROKER_QUEUE_DIR = os.path.join(BASE_DIR, 'celery_broker')
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        'data_folder_in': os.path.join(CELERY_BROKER_QUEUE_DIR, 'queue'),
+        'data_folder_out': os.path.join(CELERY_BROKER_QUEUE_DIR, 'queue'),
+        'processed_folder': os.path.join(CELERY_BROKER_QUEUE_DIR, 'processed'),
+        'control_folder': os.path.join(CELERY_BROKER_QUEUE_DIR, 'control'),
+        'store_processed': False,
+    }
+
+# Run tasks in-process instead of queueing them (default in DEBUG mode)
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', str(DEBUG)).lower() == 'true'
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
@@ -321,6 +412,11 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        # One JSON object per line
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'file': {
@@ -334,6 +430,12 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'performance': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'performance.log'),
+            'formatter': 'message',
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
@@ -350,6 +452,19 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'khschool.performance': {
+            'handlers': ['performance'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        # Icon font subsetting during collectstatic logs every table it drops
+        'fontTools': {
+            'level': 'ERROR',
+        },
+        # PDF optimization (khschool/documents.py) reports its set-up
+        'pikepdf': {
+            'level': 'WARNING',
+        },
     },
 }
 
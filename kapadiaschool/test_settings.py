@@ -0,0 +1,35 @@
+"""
+Settings for running the test suite.
+
+The tests clear the cache and bump content versions, so they must never
+run against the shared file or Redis cache of the site. pytest uses this
+module directly (pytest.ini); ``manage.py test`` keeps the regular
+settings and applies the same cache through TestRunner.
+"""
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from .settings import *  # noqa: F401,F403
+
+# A private in-memory cache per test process
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+}
+
+CACHES = TEST_CACHES
+
+
+class TestRunner(DiscoverRunner):
+    """Test runner of ``manage.py test``: runs the suite on TEST_CACHES"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_override = override_settings(CACHES=TEST_CACHES)
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        super().teardown_test_environment(**kwargs)
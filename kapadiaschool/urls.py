@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path,include
 from django.conf.urls.static import static
 from django.conf import settings
+from khschool.views import metrics
 import os
 
 # Generate a secure admin URL from environment variable or use a default secure one
@@ -29,6 +30,9 @@ urlpatterns = []
 # Add the admin URL (either secure or standard, but not both)
 urlpatterns.append(path(ADMIN_URL, admin.site.urls))
 
+# Prometheus metrics, for scrapers sending the METRICS_TOKEN
+urlpatterns.append(path('metrics', metrics, name='metrics'))
+
 # Add the main app URLs
 urlpatterns.append(path('', include('khschool.urls')))
 
@@ -7,6 +7,8 @@ from django.contrib import messages
 from django.http import HttpResponseForbidden
 from khschool.models import Celebration, CarouselImage, CelebrationPhoto, Gallery, GalleryImage, BranchPhoto
 from khschool.forms import CelebrationForm, CelebrationPhotoForm, CarouselImageForm, GalleryForm, GalleryImageForm, BranchPhotoForm
+from khschool.caching import invalidate_queryset
+from khschool.tasks import schedule_cache_warming
 
 # Register your models here.
 
@@ -94,11 +96,17 @@ class GalleryAdmin(admin.ModelAdmin):
     
     def mark_as_campus_featured(self, request, queryset):
         queryset.update(show_on_campus_page=True)
+        # update() sends no signals: refresh the cached pages here
+        invalidate_queryset(queryset)
+        schedule_cache_warming()
         self.message_user(request, f'{queryset.count()} galleries marked as campus featured.')
     mark_as_campus_featured.short_description = 'Mark selected galleries as campus featured'
     
     def unmark_as_campus_featured(self, request, queryset):
         queryset.update(show_on_campus_page=False)
+        # update() sends no signals: refresh the cached pages here
+        invalidate_queryset(queryset)
+        schedule_cache_warming()
         self.message_user(request, f'{queryset.count()} galleries unmarked as campus featured.')
     unmark_as_campus_featured.short_description = 'Unmark selected galleries as campus featured'
     
@@ -153,11 +161,17 @@ class BranchPhotoAdmin(admin.ModelAdmin):
     
     def mark_as_featured(self, request, queryset):
         queryset.update(is_featured=True)
+        # update() sends no signals: refresh the cached pages here
+        invalidate_queryset(queryset)
+        schedule_cache_warming()
         self.message_user(request, f'{queryset.count()} photos marked as featured.')
     mark_as_featured.short_description = 'Mark selected photos as featured'
     
     def unmark_as_featured(self, request, queryset):
         queryset.update(is_featured=False)
+        # update() sends no signals: refresh the cached pages here
+        invalidate_queryset(queryset)
+        schedule_cache_warming()
         self.message_user(request, f'{queryset.count()} photos unmarked as featured.')
     unmark_as_featured.short_description = 'Unmark selected photos as featured'
     
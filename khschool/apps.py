@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class KhschoolConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'khschool'
+
+    def ready(self):
+        from .caching import bump_site_version
+        from .schema import reset_tables
+        post_migrate.connect(reset_tables, dispatch_uid='khschool_reset_tables')
+        # Deploys run migrate: start new page versions for the new templates
+        post_migrate.connect(bump_site_version, sender=self, dispatch_uid='khschool_bump_site_version')
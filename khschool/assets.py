@@ -0,0 +1,234 @@
+"""
+Static CSS/JS bundles.
+
+Each page links a minified stylesheet bundle (the site-wide sheets plus
+its own), the framework bundle (Bootstrap, icons, header) and one deferred
+script bundle instead of a file per sheet and script. ``collectstatic`` builds the bundles into ``bundles/`` (see
+khschool.storage), where they are content-hashed and compressed like every
+other static file. Until the bundles are built, and in DEBUG mode, the
+``{% css_bundle %}`` / ``{% js_bundle %}`` tags link the source files one
+by one so edits show up without collecting.
+
+Bootstrap and Font Awesome are kept in ``static/vendor/`` (see
+``manage.py vendor_assets``) and bundled without the rules and icons the
+site does not use (see khschool.purging).
+"""
+import posixpath
+import re
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+import rcssmin
+import rjsmin
+
+from .purging import icon_codepoints, purge_css, replace_font_faces, subset_font, used_words
+
+BUNDLE_DIR = 'bundles'
+
+BOOTSTRAP_CSS = 'vendor/bootstrap-5.3.3/css/bootstrap.min.css'
+BOOTSTRAP_JS = 'vendor/bootstrap-5.3.3/js/bootstrap.bundle.min.js'
+ICONS_CSS = 'vendor/font-awesome-4.7.0/css/font-awesome.min.css'
+
+# Vendored stylesheets bundled without their unused rules
+PURGED_CSS = {BOOTSTRAP_CSS, ICONS_CSS}
+
+# Fonts of ICONS_CSS, bundled with only the icons left after purging
+ICON_FONTS = {
+    'woff2': 'vendor/font-awesome-4.7.0/fonts/fontawesome-webfont.woff2',
+    'woff': 'vendor/font-awesome-4.7.0/fonts/fontawesome-webfont.woff',
+}
+ICON_FONT_FACE = (
+    "@font-face{{font-family:'FontAwesome';src:url('{woff2}') format('woff2'),url('{woff}') format('woff');"
+    "font-weight:normal;font-style:normal;font-display:block}}"
+)
+
+# Third-party files in static/, with where they come from and their
+# Subresource Integrity hash (checked by manage.py vendor_assets)
+VENDOR_FILES = {
+    BOOTSTRAP_CSS: (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+        'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH',
+    ),
+    f'{BOOTSTRAP_CSS}.map': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css.map',
+        'sha384-LwyFPAYeWO3SJbG/pZ2F2/f6nZxkMKWlkH/ElWNjvUD3ILLrbzetzX8ShggJy4Of',
+    ),
+    BOOTSTRAP_JS: (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+        'sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz',
+    ),
+    f'{BOOTSTRAP_JS}.map': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js.map',
+        'sha384-Vgvn9G4A9CfS51jXa46jlIkMKKuYr7Yx/s0g5vKRDoo0LbYA2yj5uVeF42qc0AJf',
+    ),
+    ICONS_CSS: (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/css/font-awesome.min.css',
+        'sha384-wvfXpqpZZVQGK6TAh5PVlGOfQNHSoD2xbE+QkPxCAFlNEevoEH3Sl0sibVcOQVnN',
+    ),
+    # The stylesheet links every format, so all of them are collected
+    'vendor/font-awesome-4.7.0/fonts/fontawesome-webfont.eot': (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/fonts/fontawesome-webfont.eot',
+        'sha384-aT4Js4F9nY6/YfdaUe74bgxzlDR1S188jXIJZQj981StDN6YfBNOetz0JVYt8RRs',
+    ),
+    'vendor/font-awesome-4.7.0/fonts/fontawesome-webfont.svg': (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/fonts/fontawesome-webfont.svg',
+        'sha384-cpmd2Pb8rcQw0Rb0JqVxqpRf1aPgEYmq/SvC4aU562SjUEQ+KClejtxnrYLwTOI1',
+    ),
+    'vendor/font-awesome-4.7.0/fonts/fontawesome-webfont.ttf': (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/fonts/fontawesome-webfont.ttf',
+        'sha384-arWNUkFcwgK/p/bP6IcquY+ZOXqnmOVkdFBJpkkKX7ldohEAUno5hxI+lm4tn4Cm',
+    ),
+    ICON_FONTS['woff']: (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/fonts/fontawesome-webfont.woff',
+        'sha384-miAIzLueFC2a1i22Q520oFQwc/N2wtaYe93QyrKYlj5f0T0+DkQEpMs7S+MvkTW/',
+    ),
+    ICON_FONTS['woff2']: (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/fonts/fontawesome-webfont.woff2',
+        'sha384-wmfasCsFE3p9BgQSCciiJ0R6GvOSsKKZJMXBvTiCuWa3ypa5yXGVjSdzuU/ON6P6',
+    ),
+}
+
+# Linked by base.html on every page, before Bootstrap
+SITE_CSS = ['css/base.css', 'css/image-styles.css', 'css/sticky-footer.css']
+
+CSS_BUNDLES = {
+    'site': SITE_CSS,
+    'home': SITE_CSS + ['css/home.css', 'css/celebrations.css'],
+    'achievements': SITE_CSS + ['css/achievements.css'],
+    'activities': SITE_CSS + ['css/activities.css'],
+    'admissions': SITE_CSS + ['css/admissions.css'],
+    'blog': SITE_CSS + ['css/blog.css'],
+    'campus': SITE_CSS + ['css/campus.css'],
+    'celebrations': SITE_CSS + ['css/celebrations.css'],
+    'contact': SITE_CSS + ['css/contact.css'],
+    'facilities': SITE_CSS + ['css/facilities.css'],
+    'institutional_goals': SITE_CSS + ['css/institutional_goals.css'],
+    'our_team': SITE_CSS + ['css/our_team.css'],
+    'success_stories': SITE_CSS + ['css/success_stories.css'],
+    'team': SITE_CSS + ['css/team.css'],
+    'testimonials': SITE_CSS + ['css/testimonials.css'],
+    # Linked by base.html after the page bundle; header.css overrides Bootstrap
+    'framework': [BOOTSTRAP_CSS, ICONS_CSS, 'css/header.css'],
+    # Linked after the framework, whose rules it overrides
+    'carousel': ['css/carousel.css'],
+    # Pages that do not extend base.html
+    'bootstrap': [BOOTSTRAP_CSS, ICONS_CSS],
+}
+
+JS_BUNDLES = {
+    # Deferred: the fixes wait for DOMContentLoaded, which runs deferred scripts first
+    'site': [BOOTSTRAP_JS, 'js/scrollbar-fix.js', 'js/navbar-fix.js', 'js/main.js'],
+    'bootstrap': [BOOTSTRAP_JS],
+}
+
+BUNDLES = {'css': CSS_BUNDLES, 'js': JS_BUNDLES}
+
+_css_url_re = re.compile(r"""url\(\s*(['"]?)\s*(.*?)\s*\1\s*\)""")
+# The maps of vendored files do not match the bundles
+_source_map_re = re.compile(r'^\s*(?://# sourceMappingURL=.*|/\*# sourceMappingURL=.*\*/)\s*$', re.MULTILINE)
+
+
+def bundle_path(name, kind):
+    """Return the static path of a bundle, e.g. bundles/home.css"""
+    return f'{BUNDLE_DIR}/{name}.{kind}'
+
+
+def rebase_css_urls(css, source, target):
+    """Rewrite the relative url()s of a stylesheet moved from ``source`` to ``target``"""
+    def rebase(match):
+        quote, url = match.groups()
+        if not url or url.startswith(('data:', '#', '/', 'http:', 'https:')):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return f'url({quote}{posixpath.relpath(path, posixpath.dirname(target))}{quote})'
+
+    return _css_url_re.sub(rebase, css)
+
+
+def absolute_css_urls(css, stylesheet_url):
+    """Resolve the relative url()s of a stylesheet against its URL, for use outside of it"""
+    def resolve(match):
+        quote, url = match.groups()
+        if not url or url.startswith(('data:', '#')):
+            return match.group(0)
+        return f'url({quote}{urljoin(stylesheet_url, url)}{quote})'
+
+    return _css_url_re.sub(resolve, css)
+
+
+def _read(storage, path):
+    with storage.open(path) as static_file:
+        return static_file.read().decode('utf-8')
+
+
+def purge_words(storage):
+    """Return the words that may name a class: the project's, and those of the bundled scripts"""
+    scripts = {source for sources in JS_BUNDLES.values() for source in sources}
+    return used_words(*(_read(storage, source) for source in sorted(scripts)))
+
+
+def icon_font_path(flavor):
+    """Return the static path of the bundled icon font subset"""
+    return f'{BUNDLE_DIR}/fonts/{posixpath.basename(ICON_FONTS[flavor])}'
+
+
+def bundle_content(storage, name, kind, words=None):
+    """
+    Concatenate the sources of a bundle, read from ``storage``, minifying
+    the ones that are not minified yet and purging PURGED_CSS with
+    ``words`` (default: ``purge_words(storage)``).
+    """
+    path = bundle_path(name, kind)
+    parts = []
+    for source in BUNDLES[kind][name]:
+        text = _source_map_re.sub('', _read(storage, source))
+        minified = '.min.' in source
+        if kind == 'css':
+            if source in PURGED_CSS:
+                words = purge_words(storage) if words is None else words
+                text = purge_css(text, words)
+            text = rebase_css_urls(text, source, path)
+            if source == ICONS_CSS:
+                text = replace_font_faces(text, ICON_FONT_FACE.format(**{
+                    flavor: posixpath.relpath(icon_font_path(flavor), BUNDLE_DIR) for flavor in ICON_FONTS
+                }))
+            parts.append(text if minified else rcssmin.cssmin(text))
+        else:
+            text = text if minified else rjsmin.jsmin(text)
+            # A script without a final semicolon must not run into the next one
+            parts.append(text.rstrip().rstrip(';') + ';')
+    return '\n'.join(parts) + '\n'
+
+
+def _write(storage, path, content):
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(content))
+
+
+def build_bundles(storage):
+    """Write every bundle and the icon font subsets into ``storage``; returns their paths"""
+    words = purge_words(storage)
+    codepoints = icon_codepoints(purge_css(_read(storage, ICONS_CSS), words))
+    paths = []
+    for flavor, source in ICON_FONTS.items():
+        with storage.open(source) as font_file:
+            _write(storage, icon_font_path(flavor), subset_font(font_file.read(), codepoints, flavor))
+        paths.append(icon_font_path(flavor))
+
+    for kind, bundles in BUNDLES.items():
+        for name in bundles:
+            path = bundle_path(name, kind)
+            _write(storage, path, bundle_content(storage, name, kind, words).encode('utf-8'))
+            paths.append(path)
+    return paths
+
+
+def bundle_urls(name, kind):
+    """Return the URLs to link for a bundle: the built bundle, or else its sources"""
+    path = bundle_path(name, kind)
+    if not settings.DEBUG and path in getattr(staticfiles_storage, 'hashed_files', {}):
+        return [staticfiles_storage.url(path)]
+    return [staticfiles_storage.url(source) for source in BUNDLES[kind][name]]
@@ -0,0 +1,297 @@
+"""
+Content versions for cache invalidation and conditional GET.
+
+Every cached page belongs to one or more content groups ("home", "gallery",
+"celebrations", "campus:kadi", ...). Saving or deleting a model bumps the
+version of each group that displays it. The versions are part of the page
+cache key, so pages rendered before the change are never looked up again
+and simply expire. View data caches (``homepage_data``,
+``<campus>_featured_photos``) remember the versions they were built from
+and are rebuilt once those move on (see ``get_or_build``).
+
+Versions are millisecond timestamps, so they also serve as the ETag and
+Last-Modified of a page (see ``content_condition``). Every page also
+depends on the "site" group, which ``migrate`` bumps on each deploy so
+template changes are never hidden behind a cached page or a 304.
+
+Rebuilds are single-flight: when a cached value is stale or missing only
+the worker holding the rebuild lock regenerates it, while the others keep
+serving the stale copy (stale-while-revalidate). The lock relies on an
+atomic ``cache.add()`` (Redis, memcached, locmem); with the file cache,
+whose add() is a read then a write, it is an exclusively created lock file.
+"""
+from datetime import datetime, timezone
+from functools import cache as memoize
+import hashlib
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from django.views.decorators.http import condition
+
+from .instrumentation import record_cache
+
+VERSION_KEY = 'content_version:{}'
+
+# Group shared by every page, bumped on deploy
+SITE_GROUP = 'site'
+
+# Named routes whose pages show database content, and the groups they show
+PAGE_GROUPS = {
+    'home': ('home',),
+    'gallery': ('gallery',),
+    'gallery_more': ('gallery',),
+    'celebrations': ('celebrations',),
+}
+
+# Groups displaying each model (campus pages are added per BranchPhoto.campus_branch)
+MODEL_GROUPS = {
+    'khschool.CarouselImage': ('home',),
+    'khschool.Celebration': ('home', 'gallery', 'celebrations'),
+    'khschool.CelebrationPhoto': ('gallery', 'celebrations'),
+    'khschool.Gallery': ('home', 'gallery'),
+    'khschool.GalleryImage': ('home', 'gallery'),
+    'khschool.BranchPhoto': ('gallery',),
+}
+
+# How long stale copies are kept around after they stop being fresh
+STALE_SECONDS = 60 * 60 * 24
+
+# A crashed rebuild holds its lock no longer than this
+REBUILD_LOCK_SECONDS = 30
+
+# How long a request waits for another worker to fill a cold cache
+REBUILD_WAIT_SECONDS = 5
+
+
+def campus_codes():
+    """Return the campus codes that have their own pages"""
+    BranchPhoto = apps.get_model('khschool', 'BranchPhoto')
+    return [code for code, name in BranchPhoto.CAMPUS_CHOICES]
+
+
+def campus_group(campus):
+    """Return the content group of a campus page and its photo gallery"""
+    return f'campus:{campus}'
+
+
+def page_groups(url_name):
+    """Return the content groups shown by a named route"""
+    if url_name in PAGE_GROUPS:
+        return PAGE_GROUPS[url_name]
+    # Campus pages are named after the campus, their galleries "<campus>_gallery"
+    campus = url_name.removesuffix('_gallery') if url_name else None
+    if campus in campus_codes():
+        return (campus_group(campus),)
+    return ()
+
+
+def content_groups(instance):
+    """Return the content groups that display a model instance"""
+    groups = list(MODEL_GROUPS.get(instance._meta.label, ()))
+    if instance._meta.label == 'khschool.BranchPhoto':
+        # A photo moved to another campus also leaves its old campus page
+        campuses = {instance.campus_branch, getattr(instance, '_stored_campus_branch', None)}
+        groups.extend(campus_group(campus) for campus in sorted(campuses - {None}))
+    return groups
+
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def get_versions(groups):
+    """Return the current version of each group, starting a version if none is stored"""
+    keys = {group: VERSION_KEY.format(group) for group in groups}
+    stored = cache.get_many(list(keys.values()))
+    versions = {}
+    for group, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            # First use (or evicted): whoever adds first wins
+            cache.add(key, _new_version(), None)
+            version = cache.get(key)
+        versions[group] = version
+    return versions
+
+
+def bump_versions(*groups):
+    """Mark the cached pages and view data of the given groups as stale"""
+    if not groups:
+        return
+    keys = [VERSION_KEY.format(group) for group in groups]
+    # Always move forward, even within the millisecond the old version started
+    version = max([_new_version()] + [stored + 1 for stored in cache.get_many(keys).values()])
+    cache.set_many({key: version for key in keys}, None)
+
+
+def invalidate_content(instance):
+    """Bump the groups that display an instance once the current transaction commits"""
+    groups = content_groups(instance)
+    if groups:
+        transaction.on_commit(lambda: bump_versions(*groups))
+
+
+def invalidate_queryset(queryset):
+    """
+    Bump the groups that display any object of a queryset once the current
+    transaction commits. For bulk updates, which send no model signals.
+    """
+    groups = set()
+    for instance in queryset:
+        groups.update(content_groups(instance))
+    if groups:
+        transaction.on_commit(lambda: bump_versions(*sorted(groups)))
+
+
+def _lock_path(key):
+    """Return the lock file of a rebuild with the file cache, or None with other backends"""
+    backend = caches['default']
+    if not isinstance(backend, FileBasedCache):
+        return None
+    # Not a .djcache file, so the cache's culling and clear() leave it alone
+    return backend._key_to_file(f'{key}:rebuild').removesuffix(backend.cache_suffix) + '.lock'
+
+
+def acquire_rebuild(key):
+    """Try to become the one worker rebuilding a cache entry"""
+    path = _lock_path(key)
+    if path is None:
+        return cache.add(f'{key}:rebuild', True, REBUILD_LOCK_SECONDS)
+
+    try:
+        if time.time() - os.path.getmtime(path) > REBUILD_LOCK_SECONDS:
+            os.remove(path)  # Left behind by a crashed rebuild
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def release_rebuild(key):
+    """Release the rebuild lock of a cache entry"""
+    path = _lock_path(key)
+    if path is None:
+        cache.delete(f'{key}:rebuild')
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_or_build(key, build, groups, timeout=None):
+    """
+    Return the cached value of ``key``, rebuilding it with ``build()`` when
+    it is missing, older than ``timeout`` or built before the last change to
+    one of ``groups``. Only one worker rebuilds; the others get the stale
+    value meanwhile, or wait briefly for the rebuild when nothing is cached.
+    """
+    timeout = timeout or settings.CACHE_MIDDLEWARE_SECONDS
+    versions = get_versions(groups)
+    entry = cache.get(key)  # (value, built_versions, fresh_until)
+    if entry is not None and entry[1] == versions and entry[2] > time.time():
+        record_cache(key, 'hit')
+        return entry[0]
+
+    if acquire_rebuild(key):
+        record_cache(key, 'miss')
+        try:
+            value = build()
+            cache.set(key, (value, versions, time.time() + timeout), timeout + STALE_SECONDS)
+            return value
+        finally:
+            release_rebuild(key)
+
+    if entry is not None:
+        record_cache(key, 'stale')
+        return entry[0]
+
+    record_cache(key, 'miss')
+    # Cold cache: give the rebuilding worker a moment before doing the work too
+    deadline = time.time() + REBUILD_WAIT_SECONDS
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return build()
+
+
+def bump_site_version(**kwargs):
+    """Invalidate every cached page (connected to post_migrate, i.e. run on deploy)"""
+    bump_versions(SITE_GROUP)
+
+
+@memoize
+def public_route_names():
+    """Return the names of the public site routes (khschool/urls.py)"""
+    from .urls import urlpatterns
+    return frozenset(pattern.name for pattern in urlpatterns if pattern.name)
+
+
+def request_url_name(request):
+    """Return the route name of a request (None if it does not resolve), resolved once"""
+    if not hasattr(request, '_page_url_name'):
+        try:
+            request._page_url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            request._page_url_name = None
+    return request._page_url_name
+
+
+def is_public_route(request):
+    """Check whether a request is for one of the public site routes"""
+    return request_url_name(request) in public_route_names()
+
+
+def request_versions(request):
+    """
+    Return the versions of the content groups shown by the requested page,
+    looked up once per request.
+    """
+    if not hasattr(request, '_content_versions'):
+        groups = page_groups(request_url_name(request))
+        request._content_versions = get_versions((SITE_GROUP,) + tuple(groups))
+    return request._content_versions
+
+
+def page_cache_prefix(request):
+    """
+    Return the page cache key prefix for a request: the site prefix plus the
+    versions of the content groups the requested page shows.
+    """
+    versions = request_versions(request)
+    return '.'.join(
+        [settings.CACHE_MIDDLEWARE_KEY_PREFIX] + [f'{group}-{version}' for group, version in versions.items()]
+    )
+
+
+def stale_page_key(request):
+    """Version-independent cache key of the last rendered copy of a page"""
+    url = hashlib.md5(request.build_absolute_uri().encode(), usedforsecurity=False).hexdigest()
+    return f'{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.stale_page.{url}'
+
+
+def content_etag(request, *args, **kwargs):
+    """ETag of a page: the versions of everything it shows"""
+    return '-'.join(str(version) for version in request_versions(request).values())
+
+
+def content_last_modified(request, *args, **kwargs):
+    """Last-Modified of a page: the newest version of everything it shows"""
+    newest = max(request_versions(request).values())
+    return datetime.fromtimestamp(newest / 1000, tz=timezone.utc)
+
+
+# Answers If-None-Match / If-Modified-Since with 304 before the view runs
+content_condition = condition(etag_func=content_etag, last_modified_func=content_last_modified)
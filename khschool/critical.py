@@ -0,0 +1,230 @@
+"""
+Critical CSS.
+
+``build_critical_css`` renders the pages listed in CRITICAL_PAGES and keeps
+the rules of their stylesheets that can style the first screen: the header
+and carousel above ``<main>`` and the first FOLD_ELEMENTS elements inside
+it. A rule is kept when the element types, classes and ids its selector
+needs all appear in that part of the page (a superset of what actually
+matches, without needing a browser); :hover, :focus and the other
+interactive states and the contents of closed dropdowns are left to the
+full stylesheets, and so are the custom properties no kept rule uses. The
+url()s of the kept rules are made absolute, since they no longer sit in
+their stylesheet. Pages whose result exceeds CRITICAL_CSS_BUDGET are
+extracted again with a smaller fold.
+
+The result is stored next to the bundles in ``critical/<page>.css``; the
+``{% critical_css %}`` tag inlines it in ``<head>`` and the page's
+stylesheet links then load without blocking the first paint.
+"""
+import gzip
+from html.parser import HTMLParser
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.urls import reverse
+import rcssmin
+
+from .assets import absolute_css_urls
+from .caching import SITE_GROUP, bump_versions
+from .purging import filter_css, selector_classes, strip_selector_arguments
+from .warming import render_page
+
+CRITICAL_DIR = 'critical'
+
+# Critical CSS name (used by the {% critical_css %} tag) -> named route
+CRITICAL_PAGES = {
+    'home': 'home',
+    'gallery': 'gallery',
+    'admissions': 'admissions',
+    'kadi': 'kadi',
+    'chandkheda': 'chandkheda',
+    'chattral': 'chattral',
+    'iffco': 'iffco',
+}
+
+# Elements of <main> counted as the first screen
+FOLD_ELEMENTS = 40
+
+# Largest gzipped critical CSS: half of the ~14 KB a new connection delivers
+# in its first round trip, leaving the rest for the page's own markup
+CRITICAL_CSS_BUDGET = 7 * 1024
+
+# Classes of the elements hidden until opened: their contents are not on the first screen
+HIDDEN_CLASSES = {'dropdown-menu', 'modal', 'offcanvas'}
+
+# Elements without an end tag
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr',
+}
+
+_id_re = re.compile(r'#(-?[_a-zA-Z][\w-]*)')
+_pseudo_re = re.compile(r'::?[\w-]+')
+_combinator_re = re.compile(r'\s*[\s>+~]\s*')
+_type_re = re.compile(r'[a-zA-Z][\w-]*')
+_attribute_name_re = re.compile(r'\[\s*([\w-]+)')
+# States reached through the pointer or keyboard, after the first paint
+_interactive_re = re.compile(r':(?:hover|focus|focus-visible|focus-within|active|visited)\b')
+_property_re = re.compile(r'(?<=[{;])\s*(--[\w-]+)\s*:[^;{}]*;?')
+_var_re = re.compile(r'var\(\s*(--[\w-]+)')
+_empty_rule_re = re.compile(r'(?:^|(?<=[{}]))[^{}]+\{\}')
+
+
+class FoldParser(HTMLParser):
+    """Collects the element types, classes, ids, attributes and stylesheets of the first screen"""
+
+    def __init__(self, fold_elements=FOLD_ELEMENTS):
+        super().__init__()
+        self.fold_elements = fold_elements
+        self.main_elements = None
+        # Open elements inside a hidden container, while in one
+        self.hidden_depth = None
+        self.types, self.classes, self.ids, self.attributes = set(), set(), set(), set()
+        self.stylesheets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        rel = (attrs.get('rel') or '').split()
+        if tag == 'link' and ('stylesheet' in rel or ('preload' in rel and attrs.get('as') == 'style')):
+            if attrs.get('href') not in self.stylesheets:
+                self.stylesheets.append(attrs.get('href'))
+
+        if self.hidden_depth is not None:
+            if tag not in VOID_ELEMENTS:
+                self.hidden_depth += 1
+            return
+
+        if self.main_elements is not None:
+            if self.main_elements >= self.fold_elements:
+                return
+            self.main_elements += 1
+        elif tag == 'main':
+            self.main_elements = 0
+
+        self.types.add(tag)
+        self.attributes.update(attrs)
+        classes = (attrs.get('class') or '').split()
+        self.classes.update(classes)
+        if attrs.get('id'):
+            self.ids.add(attrs['id'])
+        # The container itself stays, for the rules hiding it
+        if HIDDEN_CLASSES.intersection(classes) and tag not in VOID_ELEMENTS:
+            self.hidden_depth = 0
+
+    def handle_endtag(self, tag):
+        if self.hidden_depth is not None:
+            self.hidden_depth = self.hidden_depth - 1 if self.hidden_depth else None
+
+    def matches(self, selector):
+        """Check whether every type, class, id and attribute a selector needs is on the first screen"""
+        if _interactive_re.search(selector):
+            return False
+        stripped = _pseudo_re.sub('', strip_selector_arguments(selector))
+        types = {
+            match.group(0).lower()
+            for compound in _combinator_re.split(stripped)
+            if (match := _type_re.match(compound))
+        }
+        return (
+            types <= self.types
+            and selector_classes(selector) <= self.classes
+            and set(_id_re.findall(stripped)) <= self.ids
+            and {name.lower() for name in _attribute_name_re.findall(selector)} <= self.attributes
+        )
+
+
+def critical_path(name):
+    """Return the static path of a page's critical CSS, e.g. critical/home.css"""
+    return f'{CRITICAL_DIR}/{name}.css'
+
+
+def _stylesheet(url):
+    """Return the text of a linked static stylesheet (collected, or else the source file)"""
+    path = url.split('?')[0].removeprefix(settings.STATIC_URL)
+    if staticfiles_storage.exists(path):
+        with staticfiles_storage.open(path) as stylesheet:
+            return stylesheet.read().decode('utf-8')
+    source = finders.find(path)
+    if source is None:
+        return ''
+    with open(source, encoding='utf-8') as stylesheet:
+        return stylesheet.read()
+
+
+def _drop_unused_properties(css):
+    """Remove the custom property declarations no var() of a stylesheet refers to, and the emptied rules"""
+    while True:
+        used = set(_var_re.findall(css))
+        pruned = _property_re.sub(lambda match: match.group(0) if match.group(1) in used else '', css)
+        pruned = _empty_rule_re.sub('', pruned)
+        if pruned == css:
+            return css
+        css = pruned
+
+
+def _fold_css(html, fold_elements):
+    fold = FoldParser(fold_elements)
+    fold.feed(html)
+    css = ''.join(
+        absolute_css_urls(
+            filter_css(
+                _stylesheet(url),
+                fold.matches,
+                # Icon glyphs are on the first screen; comments and @keyframes can wait
+                lambda prelude: prelude.startswith('@font-face'),
+            ),
+            url,
+        )
+        for url in fold.stylesheets
+        if url and url.startswith(settings.STATIC_URL)
+    )
+    return _drop_unused_properties(rcssmin.cssmin(css))
+
+
+def critical_css(html, budget=CRITICAL_CSS_BUDGET):
+    """
+    Return the rules of a page's stylesheets that can style its first screen,
+    halving the fold until they fit ``budget`` gzipped bytes. Returns None
+    when even the rules of the header alone do not fit.
+    """
+    fold_elements = FOLD_ELEMENTS
+    while True:
+        css = _fold_css(html, fold_elements)
+        if len(gzip.compress(css.encode('utf-8'), mtime=0)) <= budget:
+            return css
+        if not fold_elements:
+            return None
+        fold_elements //= 2
+
+
+def build_critical_css(site_url=None):
+    """
+    Write the critical CSS of every page in CRITICAL_PAGES; yields (name,
+    status code, size in bytes, or None when the page keeps its blocking
+    stylesheets). Cached pages are invalidated afterwards so they are
+    rendered again with it.
+    """
+    for name, route in CRITICAL_PAGES.items():
+        response = render_page(reverse(route), site_url)
+        css = critical_css(response.content.decode('utf-8')) if response.status_code == 200 else None
+        path = critical_path(name)
+        if staticfiles_storage.exists(path):
+            staticfiles_storage.delete(path)
+        if css is None:
+            yield name, response.status_code, None
+            continue
+        staticfiles_storage.save(path, ContentFile(css.encode('utf-8')))
+        yield name, response.status_code, len(css)
+    bump_versions(SITE_GROUP)
+
+
+def inline_critical_css(name):
+    """Return the stored critical CSS of a page, or None (not built, or DEBUG)"""
+    path = critical_path(name)
+    if settings.DEBUG or not staticfiles_storage.exists(path):
+        return None
+    with staticfiles_storage.open(path) as stylesheet:
+        return stylesheet.read().decode('utf-8')
@@ -0,0 +1,254 @@
+"""
+PDF documents (certificates, fee structure, ...) under ``static/documents/``.
+
+During ``collectstatic`` (see khschool.storage) every collected PDF is
+served as a smaller, linearized variant of itself, written over the copy
+in STATIC_ROOT before it is hashed:
+
+* documents with the same content under two names are collected once,
+  the other name pointing at the same hashed file;
+* the fonts embedded whole (as "Microsoft Print to PDF" does) are cut down
+  to the glyphs the pages draw;
+* scanned pages above DOCUMENT_DPI are downsampled and re-encoded, when
+  that saves enough to be worth it;
+* the file is linearized ("fast web view"), so a viewer can show the first
+  page while the rest downloads in byte ranges.
+
+A WebP preview of the first page is rendered next to it
+(``documents/previews/``), for the ``{% document_preview %}`` tag.
+"""
+import hashlib
+from io import BytesIO
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from fontTools import subset
+from fontTools.ttLib import TTFont
+from PIL import Image
+import pikepdf
+import pypdfium2
+
+DOCUMENT_DIR = 'documents'
+PREVIEW_DIR = f'{DOCUMENT_DIR}/previews'
+
+# Resolution scanned pages are downsampled to, and the JPEG quality they
+# are re-encoded with (only kept when it saves MIN_IMAGE_SAVING)
+DOCUMENT_DPI = 150
+DOCUMENT_JPEG_QUALITY = 85
+MIN_IMAGE_SAVING = 0.1
+
+# Previews are shown 40px wide next to the document links, sharp on 2x screens
+PREVIEW_WIDTH = 80
+PREVIEW_QUALITY = 75
+
+_text_operators = {'Tj', "'", '"', 'TJ'}
+
+
+def is_document(path):
+    """Check whether a static path is a PDF document of DOCUMENT_DIR"""
+    return path.startswith(f'{DOCUMENT_DIR}/') and path.lower().endswith('.pdf')
+
+
+def preview_path(path):
+    """Return the static path of a document's preview, e.g. documents/previews/Fees.webp"""
+    return f'{PREVIEW_DIR}/{posixpath.splitext(posixpath.basename(path))[0]}.webp'
+
+
+def preview_url(path):
+    """Return the URL of a document's preview, or None (not rendered yet, or DEBUG)"""
+    preview = preview_path(path)
+    if settings.DEBUG or preview not in getattr(staticfiles_storage, 'hashed_files', {}):
+        return None
+    return staticfiles_storage.url(preview)
+
+
+def _read_source(files, path):
+    source_storage, source_path = files[path]
+    with source_storage.open(source_path) as source:
+        return source.read()
+
+
+def duplicate_documents(files):
+    """
+    Return {path: first path with the same content} for ``files``, the
+    documents as collectstatic hands them over: {path: (storage, source path)}.
+    """
+    seen, duplicates = {}, {}
+    for path in sorted(files):
+        digest = hashlib.sha256(_read_source(files, path)).hexdigest()
+        if digest in seen:
+            duplicates[path] = seen[digest]
+        else:
+            seen[digest] = path
+    return duplicates
+
+
+def _identity_font_file(font):
+    """Return the embedded TrueType program of a Type0 font whose codes are glyph ids, or None"""
+    if font.get('/Subtype') != '/Type0' or font.get('/Encoding') != '/Identity-H':
+        return None
+    descendant = font.DescendantFonts[0]
+    if descendant.get('/Subtype') != '/CIDFontType2' or descendant.get('/CIDToGIDMap', pikepdf.Name.Identity) != '/Identity':
+        return None
+    return descendant.get('/FontDescriptor', {}).get('/FontFile2')
+
+
+def _collect_glyphs(content, glyphs, seen):
+    """Add the glyph ids drawn by a page or form XObject (and the forms it uses) to ``glyphs``"""
+    resources = content.get('/Resources', {})
+    fonts, xobjects = resources.get('/Font', {}), resources.get('/XObject', {})
+    font_file = None
+    for operands, operator in pikepdf.parse_content_stream(content):
+        operator = str(operator)
+        if operator == 'Tf':
+            font = fonts.get(str(operands[0]))
+            font_file = None if font is None else _identity_font_file(font)
+        elif operator in _text_operators and font_file is not None:
+            strings = operands[0] if operator == 'TJ' else operands[-1:]
+            for string in strings:
+                if isinstance(string, pikepdf.String):
+                    data = bytes(string)
+                    glyphs.setdefault(font_file.objgen, set()).update(
+                        int.from_bytes(data[index:index + 2], 'big') for index in range(0, len(data) - 1, 2)
+                    )
+        elif operator == 'Do':
+            xobject = xobjects.get(str(operands[0]))
+            if xobject is not None and xobject.get('/Subtype') == '/Form' and xobject.objgen not in seen:
+                seen.add(xobject.objgen)
+                _collect_glyphs(xobject, glyphs, seen)
+
+
+def _subset_fonts(pdf):
+    """Cut the embedded glyph-id fonts of a PDF down to the glyphs its pages draw"""
+    if '/AcroForm' in pdf.Root:
+        # Form fields draw text of their own
+        return
+    glyphs, seen = {}, set()
+    for page in pdf.pages:
+        _collect_glyphs(page.obj, glyphs, seen)
+        for annotation in page.obj.get('/Annots', []):
+            appearance = annotation.get('/AP', {}).get('/N')
+            if isinstance(appearance, pikepdf.Stream):
+                _collect_glyphs(appearance, glyphs, seen)
+
+    fonts = {}
+    for page in pdf.pages:
+        for font in page.obj.get('/Resources', {}).get('/Font', {}).values():
+            font_file = _identity_font_file(font)
+            if font_file is not None:
+                fonts[font_file.objgen] = font_file
+
+    options = subset.Options()
+    # Glyph ids are the character codes of the text, so they must not move
+    options.retain_gids = True
+    options.notdef_outline = True
+    options.layout_features = []
+    options.name_IDs = []
+    for objgen, font_file in fonts.items():
+        font = TTFont(BytesIO(font_file.read_bytes()), recalcTimestamp=False)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(gids=sorted(glyphs.get(objgen, ())))
+        subsetter.subset(font)
+        output = BytesIO()
+        font.save(output)
+        font_file.write(output.getvalue())
+        font_file.Length1 = len(output.getvalue())
+
+
+def _downsample_images(pdf):
+    """Re-encode the JPEG images of a PDF at DOCUMENT_DPI at most"""
+    done = set()
+    for page in pdf.pages:
+        left, bottom, right, top = (float(value) for value in page.mediabox)
+        width_inches, height_inches = abs(right - left) / 72, abs(top - bottom) / 72
+        for image in page.obj.get('/Resources', {}).get('/XObject', {}).values():
+            if image.objgen in done or image.get('/Subtype') != '/Image':
+                continue
+            done.add(image.objgen)
+            filters = image.get('/Filter')
+            if filters not in ('/DCTDecode', pikepdf.Array([pikepdf.Name.DCTDecode])):
+                continue
+            if image.get('/ColorSpace') not in ('/DeviceRGB', '/DeviceGray') or '/SMask' in image or '/Decode' in image:
+                continue
+            data = image.read_raw_bytes()
+            picture = Image.open(BytesIO(data))
+            # The largest an image can be drawn is the whole page
+            scale = DOCUMENT_DPI / max(picture.width / width_inches, picture.height / height_inches)
+            if scale < 1:
+                picture = picture.resize(
+                    (max(1, round(picture.width * scale)), max(1, round(picture.height * scale))), Image.LANCZOS
+                )
+            output = BytesIO()
+            picture.save(output, 'JPEG', quality=DOCUMENT_JPEG_QUALITY, optimize=True, progressive=True)
+            if len(output.getvalue()) <= len(data) * (1 - MIN_IMAGE_SAVING):
+                image.write(output.getvalue(), filter=pikepdf.Name.DCTDecode)
+                image.Width, image.Height = picture.width, picture.height
+                if '/DecodeParms' in image:
+                    del image['/DecodeParms']
+
+
+def optimize_pdf(data):
+    """
+    Return a PDF with subset fonts and downsampled scans, compressed and
+    linearized. The same PDF always gives the same bytes, so its hashed URL
+    (and the copies browsers cached) survive a new deployment.
+    """
+    with pikepdf.open(BytesIO(data)) as pdf:
+        _subset_fonts(pdf)
+        _downsample_images(pdf)
+        pdf.remove_unreferenced_resources()
+        output = BytesIO()
+        pdf.save(
+            output,
+            compress_streams=True,
+            recompress_flate=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            linearize=True,
+            deterministic_id=True,
+        )
+    return output.getvalue()
+
+
+def render_preview(data):
+    """Return a WebP image of the first page of a PDF, PREVIEW_WIDTH pixels wide"""
+    document = pypdfium2.PdfDocument(data)
+    try:
+        page = document[0]
+        picture = page.render(scale=PREVIEW_WIDTH / page.get_width()).to_pil()
+    finally:
+        document.close()
+    output = BytesIO()
+    picture.convert('RGB').save(output, 'WEBP', quality=PREVIEW_QUALITY)
+    return output.getvalue()
+
+
+def _write(storage, path, content):
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(content))
+
+
+def build_documents(storage, files):
+    """
+    Write the optimized variants of ``files`` ({path: (storage, source
+    path)}) over their collected copies in ``storage``, unless they would
+    grow by more than linearizing costs, and their previews; returns the
+    preview paths. Always made from the sources, never from the copies a
+    previous collectstatic optimized.
+    """
+    previews = []
+    for path in sorted(files):
+        data = _read_source(files, path)
+        try:
+            optimized = optimize_pdf(data)
+            preview = render_preview(optimized)
+        except (pikepdf.PdfError, pypdfium2.PdfiumError):
+            # A damaged or encrypted file is served as it is, without preview
+            continue
+        if len(optimized) < len(data) * 1.01:
+            _write(storage, path, optimized)
+        _write(storage, preview_path(path), preview)
+        previews.append(preview_path(path))
+    return previews
@@ -0,0 +1,119 @@
+"""
+Per-request performance instrumentation.
+
+``ServerTimingMiddleware`` (khschool.middleware) keeps a ``RequestMetrics``
+for each request. Database queries are timed through a connection execute
+wrapper, template renders through the ``DjangoTemplates`` backend below,
+and the page and view data caches report their hits and misses with
+``record_cache``. The totals go out as a Server-Timing header and, for a
+sample of requests, as one JSON line on the ``khschool.performance`` logger.
+"""
+from contextvars import ContextVar
+import time
+
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+from django.template.backends.django import Template as BaseTemplate
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class RequestMetrics:
+    """Where the time of one request went"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_seconds = 0.0
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.template_seconds = 0.0
+        self.cache = []  # (cache name, 'hit' / 'stale' / 'miss')
+
+    @property
+    def cache_hits(self):
+        return sum(1 for name, outcome in self.cache if outcome != 'miss')
+
+    @property
+    def cache_misses(self):
+        return sum(1 for name, outcome in self.cache if outcome == 'miss')
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Connection execute wrapper timing every query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value of the Server-Timing header"""
+        return ', '.join([
+            f'db;dur={_ms(self.db_seconds)};desc="{self.queries} queries"',
+            f'tpl;dur={_ms(self.template_seconds)};desc="Templates"',
+            f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"',
+            f'total;dur={_ms(self.total_seconds)}',
+        ])
+
+    def as_dict(self):
+        return {
+            'total_ms': _ms(self.total_seconds),
+            'db_ms': _ms(self.db_seconds),
+            'queries': self.queries,
+            'template_ms': _ms(self.template_seconds),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache': [f'{name}:{outcome}' for name, outcome in self.cache],
+        }
+
+
+def start_request():
+    """Start measuring the current request; returns its metrics and a token for end_request"""
+    metrics = RequestMetrics()
+    return metrics, _current_metrics.set(metrics)
+
+
+def end_request(token):
+    _current_metrics.reset(token)
+
+
+def current_metrics():
+    """Return the metrics of the request being handled, or None outside a request"""
+    return _current_metrics.get()
+
+
+def record_cache(name, outcome):
+    """Count a cache lookup ('hit', 'stale' or 'miss') against the current request"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.cache.append((name, outcome))
+
+
+class Template(BaseTemplate):
+    """Template that adds its render time to the current request"""
+
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """The Django template backend, with render timing (see Template)"""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from khschool.critical import build_critical_css
+
+
+class Command(BaseCommand):
+    help = 'Extract the first-screen CSS of the main pages, inlined in their <head> (run after collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--site-url',
+            type=str,
+            help='Public address of the site (defaults to the SITE_URL setting)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS('🎨 Building critical CSS...')
+        )
+
+        built = 0
+        for name, status, size in build_critical_css(site_url=options.get('site_url')):
+            if status != 200:
+                self.stdout.write(self.style.WARNING(f'   ⚠️  {name}: HTTP {status}, stylesheets stay blocking'))
+            elif size is None:
+                self.stdout.write(self.style.WARNING(f'   ⚠️  {name}: over the size budget, stylesheets stay blocking'))
+            else:
+                built += 1
+                self.stdout.write(f'   ✅ {name} ({size // 1024} KB)')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Built critical CSS for {built} pages!')
+        )
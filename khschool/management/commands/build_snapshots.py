@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from khschool.compression import brotli
+from khschool.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Render the content-free pages to static HTML (with .gz/.br copies) for nginx'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--site-url',
+            type=str,
+            help='Public address of the site (defaults to the SITE_URL setting)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS('📸 Building page snapshots...')
+        )
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('   ⚠️  Brotli is not installed, writing .gz copies only'))
+
+        built = 0
+        for path, status, files in build_snapshots(site_url=options.get('site_url')):
+            if files:
+                built += 1
+                self.stdout.write(f'   ✅ {path} ({files[0].stat().st_size // 1024} KB)')
+            else:
+                self.stdout.write(self.style.WARNING(f'   ⚠️  {path}: HTTP {status}, left to Django'))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Built {built} page snapshots!')
+        )
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from khschool.caching import bump_versions, content_groups
+from khschool.models import RENDITION_FIELDS
+from khschool.renditions import delete_renditions, refresh_renditions
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image renditions for existing uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            type=str,
+            help='Only process one model (e.g. BranchPhoto, GalleryImage)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate renditions even if they are already up to date',
+        )
+
+    def handle(self, *args, **options):
+        model_filter = options.get('model')
+        force = options.get('force', False)
+
+        self.stdout.write(
+            self.style.SUCCESS('🖼️  Generating image renditions...')
+        )
+
+        # Content groups of the pages showing a refreshed image
+        changed_groups = set()
+        for model, field_name in RENDITION_FIELDS.items():
+            if model_filter and model.__name__.lower() != model_filter.lower():
+                continue
+
+            generated = 0
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for instance in queryset.iterator():
+                if force and instance.renditions:
+                    delete_renditions(instance.renditions, getattr(instance, field_name).storage)
+                    instance.renditions = {}
+                previous = instance.renditions
+                record = refresh_renditions(instance, field_name)
+                generated += len(record.get('widths', {}))
+                if record is not previous:
+                    changed_groups.update(content_groups(instance))
+
+            self.stdout.write(
+                f'   ✅ {model.__name__}: {queryset.count()} images, {generated} renditions'
+            )
+
+        # The records were written with update(), which sends no signals;
+        # pages cached without the renditions have to be rendered again
+        bump_versions(*sorted(changed_groups))
+
+        self.stdout.write(
+            self.style.SUCCESS('✅ Rendition generation completed!')
+        )
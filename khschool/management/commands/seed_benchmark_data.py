@@ -0,0 +1,119 @@
+from datetime import timedelta
+from io import BytesIO
+import random
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from khschool.models import BranchPhoto, CarouselImage, Celebration, CelebrationPhoto, Gallery, GalleryImage
+
+
+def synthetic_image(rng, size, label):
+    """Return a JPEG with photo-like detail (gradient, shapes, noise) so it compresses like a real photo"""
+    width, height = size
+    base = tuple(rng.randrange(40, 220) for channel in range(3))
+    image = Image.new('RGB', size, base)
+    draw = ImageDraw.Draw(image)
+    for shape in range(24):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(width // 20, width // 4)
+        colour = tuple(rng.randrange(256) for channel in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=colour)
+    # Seeded grain, so the same seed gives byte-identical files
+    grain_size = (max(1, width // 4), max(1, height // 4))
+    grain = Image.frombytes('RGB', grain_size, rng.randbytes(grain_size[0] * grain_size[1] * 3))
+    image = Image.blend(image, grain.resize(size, Image.BILINEAR), 0.2)
+    ImageDraw.Draw(image).text((width // 20, height // 20), label, fill=(255, 255, 255))
+
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=88)
+    return ContentFile(buffer.getvalue(), name=f'{label.lower().replace(" ", "-")}.jpg')
+
+
+class Command(BaseCommand):
+    help = 'Fill an empty database with a reproducible synthetic dataset (with real image files) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos-per-category', type=int, default=3,
+                            help='Campus photos per campus and photo category')
+        parser.add_argument('--galleries', type=int, default=30, help='Number of galleries')
+        parser.add_argument('--images-per-gallery', type=int, default=6, help='Images in each gallery')
+        parser.add_argument('--celebrations', type=int, default=12, help='Number of celebrations')
+        parser.add_argument('--photos-per-celebration', type=int, default=4, help='Extra photos per celebration')
+        parser.add_argument('--image-size', type=str, default='1600x1067', help='Size of the generated images')
+        parser.add_argument('--seed', type=int, default=2024, help='Random seed, the same seed gives the same data')
+        parser.add_argument('--force', action='store_true',
+                            help='Add the dataset even if the database already has content')
+
+    def handle(self, *args, **options):
+        if not options['force'] and (Gallery.objects.exists() or BranchPhoto.objects.exists()):
+            raise CommandError('The database already has content, use --force to add the benchmark data anyway')
+
+        try:
+            size = tuple(int(value) for value in options['image_size'].lower().split('x'))
+        except ValueError:
+            raise CommandError('--image-size must look like 1600x1067')
+
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        self.stdout.write(
+            self.style.SUCCESS('🌱 Seeding benchmark data...')
+        )
+
+        # Uploads are processed (renditions, EXIF) by the usual model signals
+        for order in range(5):
+            CarouselImage.objects.create(
+                title=f'Slide {order + 1}', subtitle='Synthetic benchmark slide', order=order,
+                image=synthetic_image(rng, size, f'Slide {order + 1}')
+            )
+        self.stdout.write('   ✅ 5 carousel slides')
+
+        campuses = [campus for campus, campus_name in BranchPhoto.CAMPUS_CHOICES]
+        photo_categories = [category for category, label in BranchPhoto.PHOTO_CATEGORY_CHOICES]
+        photos = 0
+        for campus in campuses:
+            for category in photo_categories:
+                for index in range(options['photos_per_category']):
+                    label = f'{campus} {category} {index + 1}'
+                    BranchPhoto.objects.create(
+                        campus_branch=campus, category=category, title=label.title(), order=index,
+                        is_featured=index == 0, image=synthetic_image(rng, size, label)
+                    )
+                    photos += 1
+        self.stdout.write(f'   ✅ {photos} campus photos')
+
+        gallery_categories = [category for category, label in Gallery.CATEGORY_CHOICES]
+        for index in range(options['galleries']):
+            gallery = Gallery.objects.create(
+                name=f'Gallery {index + 1}', category=rng.choice(gallery_categories),
+                campus_branch=rng.choice(campuses), is_featured=index < 3, show_on_campus_page=index % 4 == 0,
+                description='Synthetic benchmark gallery.', date_created=now - timedelta(days=index)
+            )
+            for order in range(options['images_per_gallery']):
+                GalleryImage.objects.create(
+                    gallery=gallery, order=order, title=f'Photo {order + 1}',
+                    image=synthetic_image(rng, size, f'Gallery {index + 1} photo {order + 1}')
+                )
+        self.stdout.write(
+            f'   ✅ {options["galleries"]} galleries, {options["galleries"] * options["images_per_gallery"]} images'
+        )
+
+        for index in range(options['celebrations']):
+            celebration = Celebration.objects.create(
+                festivalname=f'Festival {index + 1}', description='Synthetic benchmark celebration.',
+                date=now - timedelta(days=30 * index), is_featured=index < 3,
+                image=synthetic_image(rng, size, f'Festival {index + 1}')
+            )
+            for order in range(options['photos_per_celebration']):
+                CelebrationPhoto.objects.create(
+                    celebration=celebration, order=order,
+                    photo=synthetic_image(rng, size, f'Festival {index + 1} photo {order + 1}')
+                )
+        self.stdout.write(f'   ✅ {options["celebrations"]} celebrations')
+
+        self.stdout.write(
+            self.style.SUCCESS('✅ Benchmark data ready!')
+        )
@@ -0,0 +1,55 @@
+import base64
+import hashlib
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from khschool.assets import VENDOR_FILES
+
+
+def integrity(data, algorithm):
+    """Return the Subresource Integrity hash of some bytes"""
+    return f'{algorithm}-{base64.b64encode(hashlib.new(algorithm, data).digest()).decode()}'
+
+
+class Command(BaseCommand):
+    help = 'Download Bootstrap and Font Awesome into static/vendor/, checking their integrity hashes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only check the files already in static/vendor/, without downloading',
+        )
+
+    def handle(self, *args, **options):
+        static_dir = Path(settings.STATICFILES_DIRS[0])
+        self.stdout.write(
+            self.style.SUCCESS('📦 Checking vendored assets...' if options['check'] else '📦 Vendoring assets...')
+        )
+
+        failed = []
+        for path, (url, expected) in VENDOR_FILES.items():
+            target = static_dir / path
+            if options['check']:
+                data = target.read_bytes() if target.exists() else b''
+            else:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    data = response.read()
+
+            if integrity(data, expected.split('-', 1)[0]) != expected:
+                failed.append(path)
+                self.stdout.write(self.style.ERROR(f'   ❌ {path}: integrity mismatch'))
+                continue
+
+            if not options['check']:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+            self.stdout.write(f'   ✅ {path} ({len(data) // 1024} KB)')
+
+        if failed:
+            raise CommandError(f'{len(failed)} vendored files do not match their integrity hash')
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {len(VENDOR_FILES)} vendored files OK!')
+        )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from khschool.warming import warm_cache, warm_urls
+
+
+class Command(BaseCommand):
+    help = 'Pre-populate the page and view data caches by requesting every public page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=1,
+            help='Number of pages to render in parallel',
+        )
+        parser.add_argument(
+            '--site-url',
+            type=str,
+            help='Public address of the site (defaults to the SITE_URL setting)',
+        )
+
+    def handle(self, *args, **options):
+        threads = options.get('threads') or 1
+        site_url = options.get('site_url')
+
+        self.stdout.write(
+            self.style.SUCCESS('🔥 Warming the page cache...')
+        )
+
+        paths = warm_urls()
+        failed = 0
+        total_seconds = 0
+        for path, status, seconds in warm_cache(paths, site_url=site_url, threads=threads):
+            total_seconds += seconds
+            if status == 200:
+                self.stdout.write(f'   ✅ {path} ({seconds * 1000:.0f} ms)')
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'   ⚠️  {path}: HTTP {status}'))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Warmed {len(paths) - failed} of {len(paths)} pages in {total_seconds:.1f}s of render time'
+            )
+        )
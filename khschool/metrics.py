@@ -0,0 +1,77 @@
+"""
+Prometheus metrics.
+
+Requests are recorded by ServerTimingMiddleware (latency, database
+queries, cache lookups), uploads by the image upload signal, and the task
+queue depth is read from the broker when /metrics is scraped. Under
+gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR (set
+up in gunicorn.conf.py) and /metrics adds up all workers; without that
+directory (runserver, tests) it shows the current process only.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+from .tasks import task_queue_depth
+
+REQUEST_LATENCY = Histogram(
+    'khschool_request_duration_seconds', 'Time to answer a request', ['route', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter('khschool_requests', 'Requests answered', ['route', 'method', 'status'])
+DB_QUERIES = Histogram(
+    'khschool_db_queries_per_request', 'Database queries run by a request', ['route'],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+DB_SECONDS = Counter('khschool_db_seconds', 'Time spent in database queries', ['route'])
+TEMPLATE_SECONDS = Counter('khschool_template_seconds', 'Time spent rendering templates', ['route'])
+CACHE_LOOKUPS = Counter(
+    'khschool_cache_lookups', 'Page and view data cache lookups (hit, stale or miss)', ['cache', 'outcome']
+)
+UPLOAD_SIZE = Histogram(
+    'khschool_upload_size_bytes', 'Size of uploaded images', ['model'],
+    buckets=(50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000),
+)
+
+
+def observe_request(route, method, status, metrics):
+    """Record a finished request (metrics: its khschool.instrumentation.RequestMetrics)"""
+    route = route or 'unmatched'
+    REQUEST_LATENCY.labels(route, method).observe(metrics.total_seconds)
+    REQUESTS.labels(route, method, str(status)).inc()
+    DB_QUERIES.labels(route).observe(metrics.queries)
+    DB_SECONDS.labels(route).inc(metrics.db_seconds)
+    TEMPLATE_SECONDS.labels(route).inc(metrics.template_seconds)
+    for cache_name, outcome in metrics.cache:
+        CACHE_LOOKUPS.labels(cache_name, outcome).inc()
+
+
+def observe_upload(model_name, size):
+    UPLOAD_SIZE.labels(model_name).observe(size)
+
+
+class TaskQueueCollector:
+    """Background tasks (image renditions, file cleanup) waiting in the broker, read at scrape time"""
+
+    def collect(self):
+        gauge = GaugeMetricFamily('khschool_task_queue_depth', 'Background tasks waiting in the broker queue')
+        depth = task_queue_depth()
+        if depth is not None:
+            gauge.add_metric([], depth)
+        yield gauge
+
+
+_queue_registry = CollectorRegistry()
+_queue_registry.register(TaskQueueCollector())
+
+
+def render_metrics():
+    """Return the metrics in the Prometheus text format and its content type"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_queue_registry), CONTENT_TYPE_LATEST
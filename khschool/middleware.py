@@ -1,12 +1,26 @@
 from django.http import HttpResponseForbidden
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connections
 from django.contrib.auth.models import User
+from django.middleware.cache import FetchFromCacheMiddleware, UpdateCacheMiddleware
+from django.utils.cache import get_max_age, has_vary_header, learn_cache_key, patch_response_headers
+from .caching import (
+    STALE_SECONDS, acquire_rebuild, is_public_route, page_cache_prefix, release_rebuild, stale_page_key,
+)
+from .compression import encode_response, precompress
+from .instrumentation import end_request, record_cache, start_request
+from .metrics import observe_request
+from contextlib import ExitStack
+import copy
+import json
 import logging
 import os
+import random
 import time
 
 logger = logging.getLogger(__name__)
+performance_logger = logging.getLogger('khschool.performance')
 
 class AdminSecurityMiddleware:
     """
@@ -120,3 +134,160 @@ class AdminSecurityMiddleware:
             logger.warning(f"IP {client_ip} blocked for {self.block_duration} seconds after {attempts} failed attempts")
         
         logger.warning(f"Failed admin login attempt from {client_ip} (attempt {attempts})")
+
+
+
+def request_cache_prefix(request):
+    """Return (and remember) the versioned page cache prefix of a request"""
+    if not hasattr(request, '_page_cache_prefix'):
+        request._page_cache_prefix = page_cache_prefix(request)
+    return request._page_cache_prefix
+
+
+class VersionedUpdateCacheMiddleware(UpdateCacheMiddleware):
+    """
+    Site-wide page cache keyed by the content versions of each page (see
+    khschool.caching). Pages stay cached on the server for
+    CACHE_MIDDLEWARE_SECONDS, browsers only keep them for
+    CACHE_MIDDLEWARE_BROWSER_SECONDS so edits show up once the version changes.
+    Pages are stored with their Brotli/gzip bodies (see khschool.compression).
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.browser_timeout = getattr(settings, 'CACHE_MIDDLEWARE_BROWSER_SECONDS', self.cache_timeout)
+
+    def process_response(self, request, response):
+        """Set the cache, if needed, then let the next worker rebuild the page"""
+        try:
+            return self.update_cache(request, response)
+        finally:
+            if getattr(request, '_page_rebuild_key', None):
+                release_rebuild(request._page_rebuild_key)
+
+    def update_cache(self, request, response):
+        if not self._should_update_cache(request, response):
+            return response
+
+        if response.streaming or response.status_code not in (200, 304):
+            return response
+
+        # Don't cache a user-specific cookie set in response to a cookie-less request
+        if not request.COOKIES and response.cookies and has_vary_header(response, 'Cookie'):
+            return response
+
+        if 'private' in response.get('Cache-Control', ()) or get_max_age(response) == 0:
+            return response
+
+        patch_response_headers(response, self.browser_timeout)
+        if response.status_code == 200:
+            cache_key = learn_cache_key(
+                request, response, self.cache_timeout, request_cache_prefix(request), cache=self.cache
+            )
+            # The stale copy outlives its version, for other workers to serve during rebuilds
+            entries = {cache_key: self.cache_timeout, stale_page_key(request): self.cache_timeout + STALE_SECONDS}
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(
+                    lambda r: self.store(precompress(r), entries)
+                )
+            else:
+                self.store(precompress(response), entries)
+        # Encode only after storing, the cached copy keeps the identity body
+        return encode_response(request, response)
+
+    def store(self, response, entries):
+        for key, timeout in entries.items():
+            self.cache.set(key, response, timeout)
+
+
+class VersionedFetchFromCacheMiddleware(FetchFromCacheMiddleware):
+    """
+    Looks pages up under the current content versions. It runs ahead of the
+    session, auth and CSRF middleware so a hit costs no session work, which
+    limits it to anonymous visitors (no session cookie) on the public
+    khschool routes.
+
+    On a miss only one worker renders the page; concurrent requests get the
+    last rendered copy (stale-while-revalidate) instead of rendering too.
+    """
+
+    def process_request(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            request._cache_update_cache = False
+            return None
+
+        if settings.SESSION_COOKIE_NAME in request.COOKIES or not is_public_route(request):
+            # Logged-in pages and the admin are neither served from nor stored in the cache
+            request._cache_update_cache = False
+            return None
+        # The middleware instance is shared between threads, so key a copy
+        middleware = copy.copy(self)
+        middleware.key_prefix = request_cache_prefix(request)
+        response = FetchFromCacheMiddleware.process_request(middleware, request)
+        if response is not None:
+            record_cache('page', 'hit')
+            return encode_response(request, response)
+
+        stale_key = stale_page_key(request)
+        if acquire_rebuild(stale_key):
+            # This request renders the page, the lock is released once it is stored
+            request._page_rebuild_key = stale_key
+            record_cache('page', 'miss')
+            return None
+
+        stale = self.cache.get(stale_key)
+        if stale is not None:
+            # Another worker is rendering the new version
+            request._cache_update_cache = False
+            record_cache('page', 'stale')
+            return encode_response(request, stale)
+        record_cache('page', 'miss')
+        return None
+
+
+class ServerTimingMiddleware:
+    """
+    Measures total, database, template and cache work per request (see
+    khschool.instrumentation). Sends it as a Server-Timing header, records
+    it in the Prometheus metrics and logs a sample of requests, plus every
+    slow one, to khschool.performance.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.send_header = getattr(settings, 'SERVER_TIMING_HEADER', True)
+        self.sample_rate = getattr(settings, 'PERFORMANCE_LOG_SAMPLE_RATE', 0)
+        self.slow_seconds = getattr(settings, 'PERFORMANCE_LOG_SLOW_MS', 1000) / 1000
+
+    def __call__(self, request):
+        metrics, token = start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+        metrics.finish()
+
+        if self.send_header:
+            response.headers['Server-Timing'] = metrics.server_timing()
+        route = self.route(request)
+        observe_request(route, request.method, response.status_code, metrics)
+        if metrics.total_seconds >= self.slow_seconds or random.random() < self.sample_rate:
+            self.log(request, response, route, metrics)
+        return response
+
+    def route(self, request):
+        """Route name of a request, also for page cache hits (which never reach the URL resolver)"""
+        match = request.resolver_match
+        return match.view_name if match else getattr(request, '_page_url_name', None)
+
+    def log(self, request, response, route, metrics):
+        performance_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khschool', '0010_branchphoto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branchphoto',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='carouselimage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='celebration',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='celebrationphoto',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='gallery',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khschool', '0011_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gallery',
+            index=models.Index(fields=['-date_created', '-id'], name='khschool_ga_date_cr_e2d729_idx'),
+        ),
+    ]
@@ -1,10 +1,15 @@
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 import os
 
+from .caching import invalidate_content
+from .metrics import observe_upload
+from .renditions import build_sources, build_srcset, is_current
+from .tasks import schedule_file_deletion, schedule_image_processing
+
 # Create your models here.
 class Celebration(models.Model):
     CELEBRATION_TYPES = [
@@ -23,6 +28,8 @@ class Celebration(models.Model):
     image = models.ImageField(upload_to='festival/images/', verbose_name='Main Image', blank=True, null=True)
     # Supabase image URL field
     image_url = models.CharField(max_length=500, verbose_name='Main Image (Supabase)', blank=True)
+    # Responsive width renditions of the local image (see khschool.renditions)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Image Renditions')
     date = models.DateTimeField(verbose_name='Date')
     is_featured = models.BooleanField(default=False, verbose_name='Feature on Homepage')
     
@@ -48,6 +55,14 @@ class Celebration(models.Model):
             return self.image_url
         return None
 
+    def get_image_srcset(self):
+        """Return the responsive srcset for the local image (empty if none)"""
+        return build_srcset(self.image, self.renditions)
+
+    def get_image_sources(self):
+        """Return (mime type, srcset) pairs for WebP/AVIF <source> elements"""
+        return build_sources(self.image, self.renditions)
+
 
 class CelebrationPhoto(models.Model):
     """Model for additional photos for a celebration"""
@@ -56,6 +71,8 @@ class CelebrationPhoto(models.Model):
     photo = models.ImageField(upload_to='festival/gallery/', verbose_name='Photo', blank=True, null=True)
     # Supabase image URL field
     photo_url = models.CharField(max_length=500, verbose_name='Photo (Supabase)', blank=True)
+    # Responsive width renditions of the local photo (see khschool.renditions)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Image Renditions')
     caption = models.CharField(max_length=255, blank=True, verbose_name='Caption')
     order = models.IntegerField(default=0, verbose_name='Display Order')
     
@@ -77,6 +94,14 @@ class CelebrationPhoto(models.Model):
             return self.photo_url
         return None
 
+    def get_photo_srcset(self):
+        """Return the responsive srcset for the local photo (empty if none)"""
+        return build_srcset(self.photo, self.renditions)
+
+    def get_photo_sources(self):
+        """Return (mime type, srcset) pairs for WebP/AVIF <source> elements"""
+        return build_sources(self.photo, self.renditions)
+
 class Gallery(models.Model):
     """Model for gallery categories"""
     CATEGORY_CHOICES = [
@@ -116,6 +141,8 @@ class Gallery(models.Model):
     thumbnail = models.ImageField(upload_to='gallery/thumbnails/', blank=True, null=True, verbose_name='Thumbnail')
     # Supabase thumbnail URL
     thumbnail_url = models.CharField(max_length=500, verbose_name='Thumbnail (Supabase)', blank=True)
+    # Responsive width renditions of the local thumbnail (see khschool.renditions)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Image Renditions')
     date_created = models.DateTimeField(default=timezone.now, verbose_name='Date Created')
     is_featured = models.BooleanField(default=False, verbose_name='Feature on Homepage')
     
@@ -128,6 +155,8 @@ class Gallery(models.Model):
             models.Index(fields=['is_featured', '-date_created']),
             models.Index(fields=['category', '-date_created']),
             models.Index(fields=['campus_branch', 'category']),
+            # Keyset order of the unfiltered gallery index (khschool.pagination)
+            models.Index(fields=['-date_created', '-id']),
         ]
     
     def __str__(self):
@@ -137,6 +166,12 @@ class Gallery(models.Model):
         """Return the number of images in this gallery"""
         return self.galleryimage_set.count()
     
+    def first_image(self):
+        """Return the first image, from a prefetched "preview_images" list when there is one"""
+        if hasattr(self, 'preview_images'):
+            return self.preview_images[0] if self.preview_images else None
+        return self.galleryimage_set.first()
+    
     def get_thumbnail_url(self):
         """Return the thumbnail URL for VPS deployment"""
         # For VPS deployment, prioritize local files
@@ -147,11 +182,35 @@ class Gallery(models.Model):
             return self.thumbnail_url
         
         # If no thumbnail, try to get the first image in the gallery
-        first_image = self.galleryimage_set.first()
+        first_image = self.first_image()
         if first_image:
             return first_image.get_image_url()
         return None
 
+    def get_thumbnail_srcset(self):
+        """Return the responsive srcset matching get_thumbnail_url()"""
+        if self.thumbnail:
+            return build_srcset(self.thumbnail, self.renditions)
+        if self.thumbnail_url:
+            return ''
+        
+        first_image = self.first_image()
+        if first_image:
+            return first_image.get_image_srcset()
+        return ''
+
+    def get_thumbnail_sources(self):
+        """Return the WebP/AVIF <source> candidates matching get_thumbnail_url()"""
+        if self.thumbnail:
+            return build_sources(self.thumbnail, self.renditions)
+        if self.thumbnail_url:
+            return []
+        
+        first_image = self.first_image()
+        if first_image:
+            return first_image.get_image_sources()
+        return []
+
 
 class GalleryImage(models.Model):
     """Model for individual images in a gallery"""
@@ -161,6 +220,8 @@ class GalleryImage(models.Model):
     image = models.ImageField(upload_to='gallery/images/', blank=True, null=True, verbose_name='Image')
     # Supabase image URL field
     image_url = models.CharField(max_length=500, verbose_name='Image (Supabase)', blank=True)
+    # Responsive width renditions of the local image (see khschool.renditions)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Image Renditions')
     caption = models.CharField(max_length=255, blank=True, verbose_name='Caption')
     description = models.TextField(blank=True, verbose_name='Description')
     date_added = models.DateTimeField(default=timezone.now, verbose_name='Date Added')
@@ -186,6 +247,14 @@ class GalleryImage(models.Model):
             return self.image_url
         return None
 
+    def get_image_srcset(self):
+        """Return the responsive srcset for the local image (empty if none)"""
+        return build_srcset(self.image, self.renditions)
+
+    def get_image_sources(self):
+        """Return (mime type, srcset) pairs for WebP/AVIF <source> elements"""
+        return build_sources(self.image, self.renditions)
+
 
 class BranchPhoto(models.Model):
     """Model for direct campus/branch photo uploads"""
@@ -236,6 +305,8 @@ class BranchPhoto(models.Model):
         verbose_name='Photo (Supabase)', 
         blank=True
     )
+    # Responsive width renditions of the local image (see khschool.renditions)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Image Renditions')
     
     is_featured = models.BooleanField(
         default=False, 
@@ -266,6 +337,14 @@ class BranchPhoto(models.Model):
             return self.image_url
         return None
 
+    def get_image_srcset(self):
+        """Return the responsive srcset for the local image (empty if none)"""
+        return build_srcset(self.image, self.renditions)
+
+    def get_image_sources(self):
+        """Return (mime type, srcset) pairs for WebP/AVIF <source> elements"""
+        return build_sources(self.image, self.renditions)
+
 
 class CarouselImage(models.Model):
     # URL choices for button links
@@ -288,6 +367,8 @@ class CarouselImage(models.Model):
     image = models.ImageField(upload_to='carousel/images/', blank=True, null=True)
     # Supabase image URL field
     image_url = models.CharField(max_length=500, verbose_name='Image (Supabase)', blank=True)
+    # Responsive width renditions of the local image (see khschool.renditions)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Image Renditions')
     button_text = models.CharField(max_length=50, default='Learn More')
     button_link = models.CharField(max_length=100, choices=URL_CHOICES, default='/')
     order = models.IntegerField(default=0, help_text='Order in which to display the carousel image')
@@ -311,65 +392,106 @@ class CarouselImage(models.Model):
             return self.image_url
         return None
 
+    def get_image_srcset(self):
+        """Return the responsive srcset for the local image (empty if none)"""
+        return build_srcset(self.image, self.renditions)
+
+    def get_image_sources(self):
+        """Return (mime type, srcset) pairs for WebP/AVIF <source> elements"""
+        return build_sources(self.image, self.renditions)
+
 # For VPS deployment, we use local file storage only
 # The URL fields are kept for data migration purposes but not actively used
+# File deletion and image processing run on the Celery worker (see khschool.tasks)
 
 @receiver(pre_delete, sender=Celebration)
 def delete_celebration_files(sender, instance, **kwargs):
     """Delete local image file when a Celebration is deleted"""
-    if instance.image and os.path.isfile(instance.image.path):
-        try:
-            os.remove(instance.image.path)
-            print(f"Deleted local image: {instance.image.path}")
-        except Exception as e:
-            print(f"Error deleting local image: {e}")
+    schedule_file_deletion(instance.image, instance.renditions)
 
 @receiver(pre_delete, sender=CelebrationPhoto)
 def delete_celebration_photo_files(sender, instance, **kwargs):
     """Delete local photo file when a CelebrationPhoto is deleted"""
-    if instance.photo and os.path.isfile(instance.photo.path):
-        try:
-            os.remove(instance.photo.path)
-            print(f"Deleted local photo: {instance.photo.path}")
-        except Exception as e:
-            print(f"Error deleting local photo: {e}")
+    schedule_file_deletion(instance.photo, instance.renditions)
 
 @receiver(pre_delete, sender=Gallery)
 def delete_gallery_thumbnail_files(sender, instance, **kwargs):
     """Delete local thumbnail file when a Gallery is deleted"""
-    if instance.thumbnail and os.path.isfile(instance.thumbnail.path):
-        try:
-            os.remove(instance.thumbnail.path)
-            print(f"Deleted local thumbnail: {instance.thumbnail.path}")
-        except Exception as e:
-            print(f"Error deleting local thumbnail: {e}")
+    schedule_file_deletion(instance.thumbnail, instance.renditions)
 
 @receiver(pre_delete, sender=GalleryImage)
 def delete_gallery_image_files(sender, instance, **kwargs):
     """Delete local image file when a GalleryImage is deleted"""
-    if instance.image and os.path.isfile(instance.image.path):
-        try:
-            os.remove(instance.image.path)
-            print(f"Deleted local gallery image: {instance.image.path}")
-        except Exception as e:
-            print(f"Error deleting local gallery image: {e}")
+    schedule_file_deletion(instance.image, instance.renditions)
 
 @receiver(pre_delete, sender=CarouselImage)
 def delete_carousel_image_files(sender, instance, **kwargs):
     """Delete local image file when a CarouselImage is deleted"""
-    if instance.image and os.path.isfile(instance.image.path):
-        try:
-            os.remove(instance.image.path)
-            print(f"Deleted local carousel image: {instance.image.path}")
-        except Exception as e:
-            print(f"Error deleting local carousel image: {e}")
+    schedule_file_deletion(instance.image, instance.renditions)
 
 @receiver(pre_delete, sender=BranchPhoto)
 def delete_branch_photo_files(sender, instance, **kwargs):
     """Delete local image file when a BranchPhoto is deleted"""
-    if instance.image and os.path.isfile(instance.image.path):
+    schedule_file_deletion(instance.image, instance.renditions)
+
+
+# Image field holding the local upload for each model with renditions
+RENDITION_FIELDS = {
+    Celebration: 'image',
+    CelebrationPhoto: 'photo',
+    Gallery: 'thumbnail',
+    GalleryImage: 'image',
+    BranchPhoto: 'image',
+    CarouselImage: 'image',
+}
+
+@receiver(post_save, sender=Celebration)
+@receiver(post_save, sender=CelebrationPhoto)
+@receiver(post_save, sender=Gallery)
+@receiver(post_save, sender=GalleryImage)
+@receiver(post_save, sender=BranchPhoto)
+@receiver(post_save, sender=CarouselImage)
+def process_image_upload(sender, instance, raw=False, **kwargs):
+    """Queue EXIF stripping and renditions when a local image is uploaded or replaced"""
+    if raw:
+        # Skip fixture loading, the files may not exist yet
+        return
+    field_name = RENDITION_FIELDS[sender]
+    field_file = getattr(instance, field_name)
+    if is_current(field_file, instance.renditions) or (not field_file and not instance.renditions):
+        # Nothing changed (e.g. only the order or title was edited)
+        return
+    if field_file:
         try:
-            os.remove(instance.image.path)
-            print(f"Deleted local branch photo: {instance.image.path}")
-        except Exception as e:
-            print(f"Error deleting local branch photo: {e}")
+            observe_upload(sender.__name__, field_file.size)
+        except OSError:
+            pass
+    schedule_image_processing(instance, field_name)
+
+
+@receiver(pre_save, sender=BranchPhoto)
+def remember_branch_photo_campus(sender, instance, raw=False, **kwargs):
+    """Remember the stored campus so moving a photo also refreshes its old campus page"""
+    if raw or not instance.pk:
+        return
+    instance._stored_campus_branch = sender.objects.filter(pk=instance.pk).values_list(
+        'campus_branch', flat=True
+    ).first()
+
+@receiver(post_save, sender=Celebration)
+@receiver(post_save, sender=CelebrationPhoto)
+@receiver(post_save, sender=Gallery)
+@receiver(post_save, sender=GalleryImage)
+@receiver(post_save, sender=BranchPhoto)
+@receiver(post_save, sender=CarouselImage)
+@receiver(post_delete, sender=Celebration)
+@receiver(post_delete, sender=CelebrationPhoto)
+@receiver(post_delete, sender=Gallery)
+@receiver(post_delete, sender=GalleryImage)
+@receiver(post_delete, sender=BranchPhoto)
+@receiver(post_delete, sender=CarouselImage)
+def invalidate_cached_pages(sender, instance, raw=False, **kwargs):
+    """Invalidate the cached pages and view data that show the changed object"""
+    if raw:
+        return
+    invalidate_content(instance)
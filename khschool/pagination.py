@@ -0,0 +1,76 @@
+"""
+Pagination helpers.
+
+Keyset (cursor) pagination for date-ordered listings: unlike OFFSET
+pagination the cost of a page does not grow with how deep the visitor has
+scrolled, each page is a ``WHERE (date, id) < (cursor)`` range scan over
+the date index, newest first.
+"""
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(date_value, pk):
+    """Encode the (date, id) position of the last item on a page"""
+    raw = f'{date_value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor into a (datetime, id) tuple.
+    Returns None for a missing or malformed cursor (i.e. the first page).
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_string, pk = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        date_value = parse_datetime(date_string)
+        pk = int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    if date_value is None:
+        return None
+    return date_value, pk
+
+
+def keyset_page(queryset, cursor, page_size, date_field='date_created'):
+    """
+    Return one page of ``queryset`` ordered newest first by (date_field, id).
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{date_field}', '-pk')
+
+    position = decode_cursor(cursor)
+    if position:
+        date_value, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lt': date_value}) | Q(**{date_field: date_value, 'pk__lt': pk})
+        )
+
+    # Fetch one extra row to know whether another page exists
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, date_field), last.pk)
+    return items, next_cursor
+
+
+class CountedPaginator(Paginator):
+    """Paginator for a list whose total is already known, so no COUNT query runs"""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        return self.known_count
@@ -0,0 +1,179 @@
+"""
+Unused CSS removal and icon font subsetting for the vendored libraries.
+
+Bootstrap and Font Awesome ship rules for every component and icon while
+the site uses a fraction of them. Like PurgeCSS, a rule is kept when every
+class its selector needs appears as a word somewhere in the templates, the
+Python code or the bundled scripts (Bootstrap's own script names the
+classes it toggles, such as ``show`` or ``collapsing``). Rules without
+class selectors (element styles, custom properties, @font-face,
+@keyframes) are always kept. The icon font is then cut down to the glyphs
+of the icon rules that are left.
+"""
+from functools import cache as memoize
+from io import BytesIO
+from pathlib import Path
+import re
+
+from django.conf import settings
+from fontTools import subset
+
+# Words in these files (relative to BASE_DIR, tests aside) may be class names
+CONTENT_GLOBS = ['templates/**/*.html', 'khschool/**/*.html', 'khschool/**/*.py']
+
+# At-rules holding rules of their own, purged like the top level
+NESTED_AT_RULES = ('@media', '@supports', '@container', '@layer')
+
+_word_re = re.compile(r'[\w-]+')
+_class_re = re.compile(r'\.(-?(?:[_a-zA-Z]|\\.)(?:[\w-]|\\.)*)')
+_attribute_re = re.compile(r'\[[^\]]*\]')
+_pseudo_arguments_re = re.compile(r':[\w-]+\([^()]*\)')
+_font_face_re = re.compile(r'@font-face\s*\{[^}]*\}')
+_icon_content_re = re.compile(r'content:\s*["\']\\([0-9a-fA-F]{1,6})["\']')
+
+
+@memoize
+def _project_words():
+    words = set()
+    base_dir = Path(settings.BASE_DIR)
+    for pattern in CONTENT_GLOBS:
+        for path in base_dir.glob(pattern):
+            if path.name.startswith('test'):
+                continue
+            words.update(_word_re.findall(path.read_text(encoding='utf-8', errors='ignore')))
+    return frozenset(words)
+
+
+def used_words(*texts):
+    """Return the words of the project templates and code, plus those of ``texts``"""
+    words = set(_project_words())
+    for text in texts:
+        words.update(_word_re.findall(text))
+    return words
+
+
+def _skip_string(css, start):
+    quote, index = css[start], start + 1
+    while index < len(css) and css[index] != quote:
+        index += 2 if css[index] == '\\' else 1
+    return index + 1
+
+
+def css_statements(css):
+    """
+    Yield the top-level statements of a stylesheet as (prelude, block body)
+    pairs. Comments and statements without a block (``@charset ...;``) come
+    with a body of None.
+    """
+    start, depth, index, block_start = 0, 0, 0, None
+    while index < len(css):
+        char = css[index]
+        if char in '"\'':
+            index = _skip_string(css, index)
+            continue
+        if css.startswith('/*', index):
+            end = css.find('*/', index + 2)
+            end = len(css) if end < 0 else end + 2
+            if depth == 0 and not css[start:index].strip():
+                yield css[index:end], None
+                start = end
+            index = end
+            continue
+        if char == '{':
+            if depth == 0:
+                block_start = index
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                yield css[start:block_start].strip(), css[block_start + 1:index]
+                start = index + 1
+        elif char == ';' and depth == 0:
+            yield css[start:index + 1].strip(), None
+            start = index + 1
+        index += 1
+
+
+def split_selectors(prelude):
+    """Split a selector list on its top-level commas"""
+    selectors, depth, start = [], 0, 0
+    for index, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:index].strip())
+            start = index + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def strip_selector_arguments(selector):
+    """Remove the attribute selectors and pseudo-class arguments of a selector"""
+    selector = _attribute_re.sub('', selector)
+    # :not(.a), :is(.a, .b), ... do not each require their classes
+    previous = None
+    while previous != selector:
+        previous, selector = selector, _pseudo_arguments_re.sub('', selector)
+    return selector
+
+
+def selector_classes(selector):
+    """Return the classes an element needs to match a selector"""
+    return {name.replace('\\', '') for name in _class_re.findall(strip_selector_arguments(selector))}
+
+
+def filter_css(css, keep_selector, keep_statement):
+    """
+    Return a stylesheet with only the selectors ``keep_selector(selector)``
+    accepts, looking into @media and the other NESTED_AT_RULES. Comments and
+    the other at-rules stay when ``keep_statement(prelude)`` accepts them.
+    """
+    kept = []
+    for prelude, body in css_statements(css):
+        if body is not None and prelude.lower().startswith(NESTED_AT_RULES):
+            nested = filter_css(body, keep_selector, keep_statement)
+            if nested.strip():
+                kept.append(f'{prelude}{{{nested}}}')
+        elif body is None or prelude.startswith('@'):
+            if keep_statement(prelude):
+                kept.append(prelude if body is None else f'{prelude}{{{body}}}')
+        else:
+            selectors = [selector for selector in split_selectors(prelude) if keep_selector(selector)]
+            if selectors:
+                kept.append(f'{",".join(selectors)}{{{body}}}')
+    return ''.join(kept)
+
+
+def purge_css(css, words):
+    """Drop the rules of a stylesheet whose selectors need a class not in ``words``"""
+    return filter_css(
+        css,
+        lambda selector: selector_classes(selector) <= words,
+        # Keep at-rules and /*! license */ comments, drop the rest (source map links)
+        lambda prelude: not prelude.startswith('/*') or prelude.startswith('/*!'),
+    )
+
+
+def icon_codepoints(css):
+    """Return the code points of the ``content: "\\f0c9"`` glyphs of a stylesheet"""
+    return {int(code, 16) for code in _icon_content_re.findall(css)}
+
+
+def subset_font(data, codepoints, flavor):
+    """Return a copy of a font (woff2/woff ``flavor``) with only the given code points"""
+    options = subset.Options()
+    options.flavor = flavor
+    font = subset.load_font(BytesIO(data), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    output = BytesIO()
+    subset.save_font(font, output, options)
+    return output.getvalue()
+
+
+def replace_font_faces(css, font_face):
+    """Replace every @font-face rule of a stylesheet with ``font_face``"""
+    return _font_face_re.sub(lambda match: font_face, css)
@@ -0,0 +1,354 @@
+"""
+Responsive image renditions for uploaded photos.
+
+Every local upload gets a set of fixed-width, down-scaled copies stored under
+``renditions/`` in the media storage, plus WebP/AVIF transcodes of every size
+(including the original) when Pillow can encode them. The generated files are
+recorded on the model in a ``renditions`` JSON field so templates can build a
+``srcset`` or ``<picture>`` element without touching the filesystem or the
+database again.
+
+Record layout::
+
+    {
+        "source": "branch_photos/sports_day.jpg",
+        "width": 4032,
+        "widths": {"320": "renditions/branch_photos/sports_day_320w.jpg", ...},
+        "formats": {
+            "webp": {"320": "renditions/branch_photos/sports_day_320w.webp", ...,
+                     "4032": "renditions/branch_photos/sports_day_4032w.webp"},
+        },
+    }
+"""
+from io import BytesIO
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from PIL import Image, ImageOps
+
+try:
+    # Optional plugin that adds AVIF support to older Pillow builds
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pillow_avif = None
+
+logger = logging.getLogger(__name__)
+
+# Default widths (in pixels) generated for every upload
+DEFAULT_RENDITION_WIDTHS = (320, 640, 1280, 1920)
+
+# Folder (inside MEDIA_ROOT) that holds all generated files
+RENDITION_DIR = 'renditions'
+
+# Modern formats, in order of preference for <picture> sources
+DEFAULT_RENDITION_FORMATS = ('avif', 'webp')
+
+FORMAT_MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+}
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+# JPEG metadata segments dropped by strip_exif: APP1 (EXIF, XMP) and
+# APP13 (Photoshop/IPTC)
+JPEG_METADATA_MARKERS = (0xE1, 0xED)
+
+# EXIF tag kept so phones' sideways photos still display upright
+EXIF_ORIENTATION = 0x0112
+
+
+def get_rendition_widths():
+    """Return the configured rendition widths, smallest first"""
+    widths = getattr(settings, 'IMAGE_RENDITION_WIDTHS', DEFAULT_RENDITION_WIDTHS)
+    return sorted(set(int(width) for width in widths))
+
+
+def get_rendition_formats():
+    """Return the configured modern formats this Pillow build can encode"""
+    Image.init()
+    formats = getattr(settings, 'IMAGE_RENDITION_FORMATS', DEFAULT_RENDITION_FORMATS)
+    return [fmt for fmt in formats if fmt in FORMAT_MIME_TYPES and fmt.upper() in Image.SAVE]
+
+
+def rendition_name(source_name, width, extension=None):
+    """Build the storage name of a rendition for the given source file"""
+    directory, filename = os.path.split(source_name)
+    stem, original_extension = os.path.splitext(filename)
+    extension = extension or original_extension.lower() or '.jpg'
+    return os.path.join(RENDITION_DIR, directory, f'{stem}_{width}w{extension}').replace('\\', '/')
+
+
+def is_current(field_file, record):
+    """
+    Check whether the stored rendition record belongs to the current file
+    and covers every modern format that is currently enabled.
+    """
+    if not field_file or not record or record.get('source') != field_file.name:
+        return False
+    return set(get_rendition_formats()) <= set(record.get('formats', {}))
+
+
+def _open_image(field_file):
+    """Open an uploaded image with EXIF orientation applied"""
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    return ImageOps.exif_transpose(image)
+
+
+def _encode(image, extension):
+    """Encode a Pillow image for the given file extension"""
+    buffer = BytesIO()
+    if extension in ('.webp', '.avif'):
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+        if extension == '.webp':
+            image.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+        else:
+            image.save(buffer, format='AVIF', quality=AVIF_QUALITY)
+    elif extension == '.png':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _save(storage, name, data):
+    """Save bytes under an exact storage name, replacing any older file"""
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def _strip_jpeg_metadata(data, orientation=None):
+    """
+    Remove the metadata segments from JPEG bytes without re-encoding the
+    image data, keeping only an EXIF orientation tag (when not 1).
+    Returns None if the data is not a well-formed JPEG.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+
+    segments = []
+    position = 2
+    while True:
+        if position + 4 > len(data) or data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            position += 1
+            continue
+        if marker in (0xDA, 0xD9):
+            # Start of scan: the compressed image data follows
+            break
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        if marker not in JPEG_METADATA_MARKERS:
+            segments.append(data[position:position + 2 + length])
+        position += 2 + length
+
+    if orientation not in (None, 1):
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        payload = exif.tobytes()
+        # After the JFIF header, where readers expect it
+        index = 1 if segments and segments[0][1] == 0xE0 else 0
+        segments.insert(index, b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload)
+
+    return b'\xff\xd8' + b''.join(segments) + data[position:]
+
+
+def strip_exif(field_file):
+    """
+    Rewrite an uploaded JPEG/PNG without its EXIF block (GPS position,
+    camera details). JPEGs keep their compressed image data untouched and
+    only an orientation tag; PNGs (lossless) have the orientation baked
+    into the pixels.
+    Returns True if the file was rewritten.
+    """
+    if not field_file:
+        return False
+
+    try:
+        field_file.open('rb')
+        try:
+            data = field_file.read()
+        finally:
+            field_file.close()
+        image = Image.open(BytesIO(data))
+        image.load()
+    except Exception as e:
+        logger.warning(f"Could not open {field_file.name} to strip EXIF: {e}")
+        return False
+
+    image_format = image.format
+    exif = image.getexif()
+    if image_format not in ('JPEG', 'PNG') or not exif:
+        return False
+
+    if image_format == 'JPEG':
+        stripped = _strip_jpeg_metadata(data, exif.get(EXIF_ORIENTATION))
+        if stripped is None:
+            logger.warning(f"Could not parse {field_file.name} to strip EXIF")
+            return False
+        if list(exif) == [EXIF_ORIENTATION] and len(stripped) >= len(data):
+            # Nothing but the orientation to remove
+            return False
+    else:
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', optimize=True, icc_profile=icc_profile)
+        stripped = buffer.getvalue()
+
+    # Overwrite in place so the field keeps pointing at the same name
+    with field_file.storage.open(field_file.name, 'wb') as output:
+        output.write(stripped)
+    return True
+
+
+def generate_renditions(field_file):
+    """
+    Generate all width renditions and modern format siblings for an
+    image field file.
+    Returns the rendition record, or an empty dict if the file is missing
+    or is not a readable image.
+    """
+    if not field_file:
+        return {}
+
+    try:
+        image = _open_image(field_file)
+    except Exception as e:
+        logger.warning(f"Could not open {field_file.name} for renditions: {e}")
+        return {}
+
+    storage = field_file.storage
+    extension = os.path.splitext(field_file.name)[1].lower()
+    if extension not in ('.png', '.jpg', '.jpeg'):
+        # Formats such as .jfif or .webp are re-encoded as JPEG
+        extension = '.jpg'
+
+    original_width, original_height = image.size
+    record = {
+        'source': field_file.name,
+        'width': original_width,
+        'widths': {},
+        'formats': {},
+    }
+
+    sizes = []
+    for width in get_rendition_widths():
+        # Never upscale: larger sizes are served by the original file
+        if width >= original_width:
+            break
+        height = max(1, round(original_height * width / original_width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        name = _save(storage, rendition_name(field_file.name, width, extension), _encode(resized, extension))
+        record['widths'][str(width)] = name
+        sizes.append((width, resized))
+
+    # Modern format siblings also cover the full-size original
+    sizes.append((original_width, image))
+    for image_format in get_rendition_formats():
+        format_extension = f'.{image_format}'
+        files = {}
+        try:
+            for width, resized in sizes:
+                files[str(width)] = _save(
+                    storage, rendition_name(field_file.name, width, format_extension), _encode(resized, format_extension)
+                )
+        except Exception as e:
+            logger.warning(f"Could not encode {field_file.name} as {image_format}: {e}")
+            for name in files.values():
+                storage.delete(name)
+            continue
+        record['formats'][image_format] = files
+
+    return record
+
+
+def delete_renditions(record, storage):
+    """Remove every file listed in a rendition record from storage"""
+    if not record:
+        return
+    names = list(record.get('widths', {}).values())
+    for files in record.get('formats', {}).values():
+        names.extend(files.values())
+    for name in names:
+        try:
+            if storage.exists(name):
+                storage.delete(name)
+        except Exception as e:
+            logger.warning(f"Error deleting rendition {name}: {e}")
+
+
+def _srcset(storage, files):
+    """Join a {width: name} mapping into srcset candidates, smallest first"""
+    return ', '.join(
+        f"{storage.url(name)} {width}w"
+        for width, name in sorted(files.items(), key=lambda item: int(item[0]))
+    )
+
+
+def build_srcset(field_file, record):
+    """
+    Build a srcset attribute value for an image field file.
+    Returns an empty string when no renditions exist for the current file.
+    """
+    if not field_file or not record or record.get('source') != field_file.name or not record.get('widths'):
+        return ''
+
+    # The original upload is the largest candidate
+    files = dict(record['widths'])
+    files[str(record['width'])] = field_file.name
+    return _srcset(field_file.storage, files)
+
+
+def build_sources(field_file, record):
+    """
+    Build the modern format <source> candidates for an image field file.
+    Returns a list of (mime_type, srcset) tuples, most preferred first.
+    """
+    if not field_file or not record or record.get('source') != field_file.name:
+        return []
+
+    formats = record.get('formats', {})
+    return [
+        (FORMAT_MIME_TYPES[image_format], _srcset(field_file.storage, formats[image_format]))
+        for image_format in get_rendition_formats()
+        if formats.get(image_format)
+    ]
+
+
+def refresh_renditions(instance, field_name, record_name='renditions'):
+    """
+    Regenerate renditions for one image field of a model instance if the
+    uploaded file changed since the last run. The record is written with a
+    queryset update so no save signals fire again.
+    """
+    field_file = getattr(instance, field_name)
+    record = getattr(instance, record_name) or {}
+
+    if is_current(field_file, record) or (not field_file and not record):
+        return record
+
+    # The old file was replaced or cleared, drop its renditions
+    if record:
+        delete_renditions(record, field_file.storage)
+
+    new_record = generate_renditions(field_file)
+    type(instance).objects.filter(pk=instance.pk).update(**{record_name: new_record})
+    setattr(instance, record_name, new_record)
+    return new_record
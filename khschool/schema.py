@@ -0,0 +1,25 @@
+"""
+Schema readiness registry.
+
+The public pages can be served before ``migrate`` has created the khschool
+tables (e.g. on a fresh deploy), so the views check that a table exists
+before querying it. Tables that were found once are remembered for the
+life of the process; only missing tables trigger another introspection
+query, and ``migrate`` (post_migrate) resets the registry.
+"""
+from django.db import connection
+
+_existing_tables = set()
+
+
+def table_exists(model):
+    """Return True if the database table of a model exists"""
+    table = model._meta.db_table
+    if table not in _existing_tables:
+        _existing_tables.update(connection.introspection.table_names())
+    return table in _existing_tables
+
+
+def reset_tables(**kwargs):
+    """Forget the known tables (connected to post_migrate)"""
+    _existing_tables.clear()
@@ -0,0 +1,83 @@
+"""
+Static snapshots of the content-free pages.
+
+Pages such as admissions or blog show no database content, so they only
+change on deploy. ``build_snapshots`` renders them once, after
+collectstatic, to ``SNAPSHOT_ROOT/<path>/index.html`` together with
+precompressed ``.gz`` and ``.br`` copies. nginx serves those files directly
+and only passes the request on to Django when a snapshot is missing (see
+nginx.conf), so these pages never reach Python.
+"""
+from pathlib import Path
+import os
+import shutil
+
+from django.conf import settings
+from django.urls import reverse
+
+from .compression import compressed_variants
+from .warming import render_page
+
+# File suffix nginx looks for (gzip_static / brotli_static) per encoding
+SUFFIXES = {'gzip': 'gz', 'br': 'br'}
+
+# Named routes whose pages render templates without database content
+SNAPSHOT_ROUTES = (
+    'contact',
+    'brief',
+    'aboutSchool',
+    'about',
+    'admissions',
+    'facilities',
+    'activities',
+    'testimonials',
+    'our_team',
+    'success_stories',
+    'achievements',
+    'blog',
+    'institutional_goals',
+    'team',
+)
+
+
+def snapshot_path(path, root=None):
+    """Return the snapshot file of a page path (e.g. /blog/ -> SNAPSHOT_ROOT/blog/index.html)"""
+    return Path(root or settings.SNAPSHOT_ROOT, path.strip('/'), 'index.html')
+
+
+def _write(target, content):
+    # Write next to the target and swap, so nginx never serves half a file
+    partial = target.with_name(f'{target.name}.partial')
+    partial.write_bytes(content)
+    os.replace(partial, target)
+
+
+def write_snapshot(path, content, root=None):
+    """Write the HTML of a page and its precompressed copies; returns the files written"""
+    target = snapshot_path(path, root)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    files = {target: content}
+    # Built once per deploy, so spend the time on the best Brotli ratio
+    for encoding, data in compressed_variants(content, brotli_quality=11).items():
+        files[target.with_name(f'{target.name}.{SUFFIXES[encoding]}')] = data
+    for name, data in files.items():
+        _write(name, data)
+    return list(files)
+
+
+def build_snapshots(root=None, site_url=None):
+    """
+    Render every snapshot route into the snapshot directory, replacing the
+    previous build. Returns (path, status code, files written) per page; a
+    page that fails to render gets no snapshot and stays served by Django.
+    """
+    root = Path(root or settings.SNAPSHOT_ROOT)
+    shutil.rmtree(root, ignore_errors=True)
+
+    results = []
+    for name in SNAPSHOT_ROUTES:
+        path = reverse(name)
+        response = render_page(path, site_url)
+        files = write_snapshot(path, response.content, root) if response.status_code == 200 else []
+        results.append((path, response.status_code, files))
+    return results
@@ -0,0 +1,186 @@
+"""
+Static images (logos, campus photos) under ``static/``.
+
+During ``collectstatic`` (see khschool.storage) every collected PNG, JPEG
+and SVG is written over with an optimized copy before it is hashed, when
+that copy is smaller:
+
+* PNGs are recompressed without their metadata (pixels untouched);
+* JPEGs are re-encoded with their own quantization tables, progressive and
+  without metadata (visually lossless);
+* SVGs are cleaned up by Scour (comments, editor metadata, rounding the
+  coordinates to SVG_PRECISION significant digits);
+* images larger than MAX_IMAGE_SIZE on their longest side are scaled down
+  to it, no page showing them any larger.
+
+PNGs and JPEGs also get a WebP sibling (``image/khs.jpeg.webp``), lossless
+for PNGs, which the ``{% static_picture %}`` tag offers to browsers that
+support it. What each file saved is logged.
+"""
+from io import BytesIO
+import logging
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from PIL import Image, UnidentifiedImageError
+from scour import scour
+
+from .renditions import WEBP_QUALITY
+
+logger = logging.getLogger(__name__)
+
+# Extension -> format the file must actually be in to be optimized
+IMAGE_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.svg': 'SVG'}
+
+MAX_IMAGE_SIZE = 2560
+JPEG_QUALITY = 85
+SVG_PRECISION = 5
+
+# Only optimized by the libraries that ship them
+SKIPPED_DIRS = ('vendor/', 'admin/')
+
+
+def is_static_image(path):
+    """Check whether a static path is an image this module optimizes"""
+    return posixpath.splitext(path)[1].lower() in IMAGE_FORMATS and not path.startswith(SKIPPED_DIRS)
+
+
+def webp_path(path):
+    """Return the static path of an image's WebP sibling, e.g. image/khs.jpeg.webp"""
+    return f'{path}.webp'
+
+
+def webp_url(path):
+    """Return the URL of an image's WebP sibling, or None (not written, or DEBUG)"""
+    sibling = webp_path(path)
+    if settings.DEBUG or sibling not in getattr(staticfiles_storage, 'hashed_files', {}):
+        return None
+    return staticfiles_storage.url(sibling)
+
+
+def _optimize_svg(data):
+    text = data.decode('utf-16' if data.startswith((b'\xff\xfe', b'\xfe\xff')) else 'utf-8')
+    options = scour.sanitizeOptions()
+    options.digits = SVG_PRECISION
+    options.strip_comments = True
+    options.remove_metadata = True
+    options.remove_descriptive_elements = True
+    # The XML declaration may name another encoding than the UTF-8 written here
+    options.strip_xml_prolog = True
+    options.indent_type = 'none'
+    options.newlines = False
+    return scour.scourString(text, options).encode('utf-8')
+
+
+def _scale_down(image):
+    if max(image.size) <= MAX_IMAGE_SIZE:
+        return image, False
+    scale = MAX_IMAGE_SIZE / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS), True
+
+
+def _optimize_bitmap(image):
+    icc_profile = image.info.get('icc_profile')
+    scaled, resized = _scale_down(image)
+    output = BytesIO()
+    if image.format == 'PNG':
+        options = {'transparency': image.info['transparency']} if 'transparency' in image.info else {}
+        scaled.save(output, 'PNG', optimize=True, icc_profile=icc_profile, **options)
+    else:
+        # The original quantization tables keep the pixels as they were,
+        # unless the image had to be scaled down
+        quality = JPEG_QUALITY if resized else 'keep'
+        orientation = image.getexif().get(0x0112)
+        exif = Image.Exif()
+        if orientation and orientation != 1:
+            exif[0x0112] = orientation
+        scaled.save(
+            output, 'JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile, exif=exif,
+        )
+    return output.getvalue()
+
+
+def _encode_webp(data):
+    image = Image.open(BytesIO(data))
+    lossless = image.format == 'PNG'
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+    output = BytesIO()
+    image.save(output, 'WEBP', lossless=lossless, quality=100 if lossless else WEBP_QUALITY, method=6)
+    return output.getvalue()
+
+
+def optimize_image(data, path):
+    """
+    Return the optimized copy of a static image and its WebP sibling (None
+    for SVGs), or (None, None) when the file is not the image its extension
+    says or cannot be made smaller.
+    """
+    image_format = IMAGE_FORMATS[posixpath.splitext(path)[1].lower()]
+    if image_format == 'SVG':
+        optimized, webp = _optimize_svg(data), None
+    else:
+        try:
+            image = Image.open(BytesIO(data))
+        except UnidentifiedImageError:
+            return None, None
+        if image.format != image_format:
+            return None, None
+        optimized = _optimize_bitmap(image)
+        if len(optimized) >= len(data):
+            optimized = data
+        webp = _encode_webp(optimized)
+        if len(webp) >= len(optimized):
+            webp = None
+    if len(optimized) >= len(data):
+        optimized = None
+    return optimized, webp
+
+
+def _write(storage, path, content):
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(content))
+
+
+def optimize_static_images(storage, files):
+    """
+    Write the optimized copies of ``files`` ({path: (storage, source path)},
+    as collectstatic hands them over) over their collected copies in
+    ``storage``, and their WebP siblings, logging the savings; returns the
+    paths of the siblings. Always made from the sources, never from the
+    copies a previous collectstatic optimized.
+    """
+    siblings = []
+    original_total = optimized_total = 0
+    for path in sorted(files):
+        source_storage, source_path = files[path]
+        with source_storage.open(source_path) as image_file:
+            data = image_file.read()
+        try:
+            optimized, webp = optimize_image(data, path)
+        except Exception as e:
+            logger.warning(f"Could not optimize {path}: {e}")
+            continue
+        if optimized is not None:
+            _write(storage, path, optimized)
+        if webp is not None:
+            _write(storage, webp_path(path), webp)
+            siblings.append(webp_path(path))
+
+        size = len(data) if optimized is None else len(optimized)
+        original_total += len(data)
+        optimized_total += size
+        logger.info(
+            f"{path}: {len(data) // 1024} KB -> {size // 1024} KB"
+            + ('' if webp is None else f" (WebP {len(webp) // 1024} KB)")
+        )
+    if original_total:
+        logger.info(
+            f"Static images: {original_total // 1024} KB -> {optimized_total // 1024} KB "
+            f"({100 - optimized_total * 100 // original_total}% saved)"
+        )
+    return siblings
@@ -0,0 +1,48 @@
+"""
+Static files storage: WhiteNoise's hashed and compressed files plus the
+CSS/JS bundles of khschool.assets, the optimized PDF documents of
+khschool.documents and the optimized images of khschool.static_images,
+built during ``collectstatic``.
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+from .assets import build_bundles
+from .documents import build_documents, duplicate_documents, is_document
+from .static_images import is_static_image, optimize_static_images
+
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        duplicates = {}
+        if not dry_run:
+            # Built from the collected sources, then hashed and compressed with them
+            for path in build_bundles(self):
+                paths[path] = (self, path)
+            duplicates = duplicate_documents({path: paths[path] for path in paths if is_document(path)})
+            for path in duplicates:
+                del paths[path]
+                self.delete(path)
+            # Optimized from their sources, then hashed from the optimized
+            # copies like the bundles
+            documents = {path: paths[path] for path in paths if is_document(path)}
+            for path in [*documents, *build_documents(self, documents)]:
+                paths[path] = (self, path)
+            images = {path: paths[path] for path in paths if is_static_image(path)}
+            for path in [*images, *optimize_static_images(self, images)]:
+                paths[path] = (self, path)
+        yield from super().post_process(paths, dry_run, **options)
+
+        if duplicates:
+            # Both names link the one hashed copy, cached once by browsers
+            for path, original in duplicates.items():
+                self.hashed_files[self.hash_key(path)] = self.hashed_files[self.hash_key(original)]
+                yield path, self.hashed_files[self.hash_key(path)], True
+            self.save_manifest()
+
+    def stored_name(self, name):
+        # Before the first collectstatic there is no manifest at all: pages
+        # link the plain source URLs. Once collected, a name missing from the
+        # manifest fails as usual (manifest_strict)
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -0,0 +1,132 @@
+"""
+Background tasks for uploaded media.
+
+Image processing and file deletion used to run inside the admin save
+request. They are now queued after the database transaction commits and
+picked up by the Celery worker (``celery -A kapadiaschool worker``).
+"""
+import logging
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Celery is optional: without it tasks simply run in-process
+    def shared_task(*task_args, **task_kwargs):
+        def decorator(func):
+            func.delay = func
+            return func
+        if len(task_args) == 1 and callable(task_args[0]) and not task_kwargs:
+            return decorator(task_args[0])
+        return decorator
+
+from .caching import bump_versions, content_groups
+from .renditions import delete_renditions, refresh_renditions, strip_exif
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def process_uploaded_image(model_label, pk, field_name):
+    """Strip EXIF data from an upload and generate its renditions"""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        # Deleted before the worker got to it
+        return
+
+    field_file = getattr(instance, field_name)
+    if field_file:
+        if strip_exif(field_file):
+            logger.info(f"Stripped EXIF data from {field_file.name}")
+    refresh_renditions(instance, field_name)
+
+    # Cached pages were rendered before the renditions existed
+    bump_versions(*content_groups(instance))
+
+
+@shared_task(ignore_result=True)
+def delete_media_files(names, renditions=None):
+    """Delete uploaded files and their renditions from media storage"""
+    for name in names:
+        try:
+            if default_storage.exists(name):
+                default_storage.delete(name)
+                logger.info(f"Deleted media file: {name}")
+        except Exception as e:
+            logger.error(f"Error deleting media file {name}: {e}")
+    delete_renditions(renditions, default_storage)
+
+
+@shared_task(ignore_result=True)
+def warm_page_cache():
+    """Render every public page into the shared cache"""
+    from .warming import warm_cache
+
+    results = warm_cache()
+    failed = [path for path, status, seconds in results if status != 200]
+    logger.info(f"Warmed {len(results) - len(failed)} pages")
+    if failed:
+        logger.warning(f"Could not warm {len(failed)} pages: {', '.join(failed)}")
+
+
+def _enqueue(task, *args, run_on_failure=True):
+    """Queue a task, running it in-process if the broker is unavailable (unless run_on_failure is False)"""
+    try:
+        task.delay(*args)
+    except Exception as e:
+        if not run_on_failure:
+            logger.warning(f"Could not queue {task.__name__}, skipped: {e}")
+            return
+        logger.warning(f"Could not queue {task.__name__}, running in-process: {e}")
+        task(*args)
+
+
+def schedule_image_processing(instance, field_name):
+    """Process a model's uploaded image once the current transaction commits"""
+    model_label = instance._meta.label
+    pk = instance.pk
+    # Without a reachable broker the renditions stay missing until
+    # generate_renditions backfills them, rather than slowing the upload
+    transaction.on_commit(
+        lambda: _enqueue(process_uploaded_image, model_label, pk, field_name, run_on_failure=False)
+    )
+
+
+def schedule_file_deletion(field_file, renditions=None):
+    """Delete an uploaded file and its renditions once the current transaction commits"""
+    names = [field_file.name] if field_file else []
+    if not names and not renditions:
+        return
+    transaction.on_commit(lambda: _enqueue(delete_media_files, names, renditions))
+
+
+def schedule_cache_warming():
+    """
+    Warm the page cache on the worker once the current transaction commits
+    (e.g. after a bulk edit). Warming renders every public page, so it
+    never runs in the request: without a worker (eager mode) or a
+    reachable broker it is skipped, and pages fill the cache as visited.
+    """
+    if getattr(warm_page_cache, 'app', None) is None or warm_page_cache.app.conf.task_always_eager:
+        logger.info("No Celery worker, cache warming skipped")
+        return
+    transaction.on_commit(lambda: _enqueue(warm_page_cache, run_on_failure=False))
+
+
+def task_queue_depth():
+    """Return the number of tasks waiting in the broker queue, or None without a reachable broker"""
+    try:
+        from kapadiaschool.celery import app
+    except ImportError:
+        return None
+    try:
+        with app.connection_for_read() as connection:
+            queue = app.conf.task_default_queue
+            return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception as e:
+        logger.warning(f"Could not read the task queue depth: {e}")
+        return None
@@ -0,0 +1,65 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from khschool.assets import bundle_urls
+from khschool.critical import inline_critical_css
+from khschool.documents import preview_url
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def critical_css(context, name):
+    """
+    Inline the critical CSS of a page (khschool.critical), once it has been
+    built, and let the stylesheet bundles linked after it load without
+    blocking the first paint.
+    Usage (before the bundles): {% critical_css 'home' %}
+    """
+    css = inline_critical_css(name)
+    request = context.get('request')
+    if css is None or request is None:
+        return ''
+    request._critical_css = True
+    return mark_safe(f'<style>{css}</style>')
+
+
+@register.simple_tag(takes_context=True)
+def css_bundle(context, name):
+    """
+    Link a stylesheet bundle of khschool.assets (its source files until
+    collectstatic has built it). After {% critical_css %} the bundle is
+    preloaded and applied once downloaded.
+    Usage: {% css_bundle 'home' %}
+    """
+    urls = bundle_urls(name, 'css')
+    request = context.get('request')
+    if getattr(request, '_critical_css', False):
+        return format_html_join('\n', (
+            '<link rel="preload" href="{0}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+            '<noscript><link href="{0}" rel="stylesheet"></noscript>'
+        ), ((url,) for url in urls))
+    return format_html_join('\n', '<link href="{}" rel="stylesheet">', ((url,) for url in urls))
+
+
+@register.simple_tag
+def js_bundle(name):
+    """
+    Load a script bundle of khschool.assets, deferred until the page is parsed.
+    Usage: {% js_bundle 'site' %}
+    """
+    return format_html_join('\n', '<script src="{}" defer></script>', ((url,) for url in bundle_urls(name, 'js')))
+
+
+@register.simple_tag
+def document_preview(path):
+    """
+    Show the first-page preview of a PDF document (khschool.documents), once
+    collectstatic has rendered it.
+    Usage (inside the document's link): {% document_preview 'documents/Fees.pdf' %}
+    """
+    url = preview_url(path)
+    if url is None:
+        return ''
+    return format_html('<img src="{}" class="pdf-preview" alt="" width="40" loading="lazy" decoding="async">', url)
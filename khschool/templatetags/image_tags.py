@@ -0,0 +1,70 @@
+from collections.abc import Mapping
+
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html, format_html_join
+
+from khschool.models import RENDITION_FIELDS
+from khschool.static_images import webp_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(obj, sizes='100vw', **attrs):
+    """
+    Render a <picture> element for a model image: AVIF/WebP sources first,
+    then the original upload (with its width srcset) as the <img> fallback.
+    Extra keyword arguments become <img> attributes, with underscores
+    turned into dashes. ``obj`` may also be a cached view model dict with
+    ``url``/``srcset``/``sources`` keys (see khschool.viewmodels).
+    Usage: {% picture photo sizes="33vw" alt=photo.title class="img-fluid" loading="lazy" %}
+    """
+    if isinstance(obj, Mapping):
+        url, srcset, sources = obj.get('url'), obj.get('srcset'), obj.get('sources')
+    else:
+        field_name = RENDITION_FIELDS[obj._meta.concrete_model]
+        url = getattr(obj, f'get_{field_name}_url')()
+        srcset = getattr(obj, f'get_{field_name}_srcset')()
+        sources = getattr(obj, f'get_{field_name}_sources')()
+    if not url:
+        return ''
+
+    img_attrs = {'src': url}
+    if srcset:
+        img_attrs['srcset'] = srcset
+        img_attrs['sizes'] = sizes
+    for key, value in attrs.items():
+        if value is not None and value is not False:
+            img_attrs[key.replace('_', '-')] = value
+
+    img = format_html(
+        '<img{}>',
+        format_html_join('', ' {}="{}"', img_attrs.items()),
+    )
+    if not sources:
+        return img
+
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+            (mime_type, source_srcset, sizes) for mime_type, source_srcset in sources
+        )),
+        img,
+    )
+
+
+@register.simple_tag
+def static_picture(path, **attrs):
+    """
+    Render a <picture> element for an image of static/: its WebP sibling
+    (see khschool.static_images) once collectstatic has written it, then
+    the image itself. Keyword arguments are <img> attributes, as for
+    {% picture %}.
+    Usage: {% static_picture 'image/campus_iffco.jpg' alt="IFFCO Campus" class="img-fluid" %}
+    """
+    url = webp_url(path)
+    return picture({
+        'url': staticfiles_storage.url(path),
+        'sources': [('image/webp', url)] if url else [],
+    }, **attrs)
@@ -1,3 +1,1178 @@
-from django.test import TestCase
+from io import BytesIO, StringIO
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.sites import site as admin_site
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.template import Context, Template
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from PIL import Image, ImageChops, ImageStat
+import pikepdf
+
+from .assets import BUNDLES, CSS_BUNDLES, VENDOR_FILES, bundle_content, rebase_css_urls
+from .caching import (
+    VERSION_KEY, acquire_rebuild, bump_versions, campus_group, get_or_build, get_versions, release_rebuild,
+    stale_page_key,
+)
+from .compression import accepted_encoding
+from .critical import FoldParser, critical_css, critical_path
+from .documents import PREVIEW_WIDTH, optimize_pdf, render_preview
+from .models import BranchPhoto, CarouselImage, Celebration, CelebrationPhoto, Gallery, GalleryImage
+from .pagination import decode_cursor, encode_cursor
+from .purging import icon_codepoints, purge_css
+from .schema import reset_tables, table_exists
+from .snapshots import build_snapshots, snapshot_path
+from .static_images import MAX_IMAGE_SIZE, optimize_image
+from .storage import BundledStaticFilesStorage
+from .views import CAMPUS_PHOTOS_PER_PAGE, GALLERY_PAGE_SIZE, celebrations, home, kadi
+from .tasks import process_uploaded_image, warm_page_cache
+from .warming import warm_urls
+
+
+def make_image_file(name='photo.jpg', size=(2400, 1600), image_format='JPEG', exif=None):
+    """Build an in-memory uploaded image of the given size"""
+    buffer = BytesIO()
+    options = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, format=image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+class MediaTestCase(TestCase):
+    """Test case that stores uploads in a throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        # Uploads go to a temporary folder and queued tasks run in-process
+        media_override = override_settings(MEDIA_ROOT=self.media_root, CELERY_TASK_ALWAYS_EAGER=True)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        cache.clear()
+
+    def create(self, model, **kwargs):
+        """Create an object and run its after-commit background tasks"""
+        with self.captureOnCommitCallbacks(execute=True):
+            instance = model.objects.create(**kwargs)
+        instance.refresh_from_db()
+        return instance
+
+
+class ImageRenditionTests(MediaTestCase):
+
+    def test_upload_generates_width_renditions(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Sports Day', image=make_image_file())
+
+        self.assertEqual(photo.renditions['source'], photo.image.name)
+        self.assertEqual(sorted(photo.renditions['widths'], key=int), ['320', '640', '1280', '1920'])
+        for name in photo.renditions['widths'].values():
+            self.assertTrue(os.path.isfile(os.path.join(self.media_root, name)))
+
+        with Image.open(os.path.join(self.media_root, photo.renditions['widths']['640'])) as rendition:
+            self.assertEqual(rendition.size, (640, 427))
+
+        srcset = photo.get_image_srcset()
+        self.assertIn('_320w.jpg 320w', srcset)
+        self.assertTrue(srcset.endswith(f'{photo.image.url} 2400w'))
+
+    def test_upload_generates_webp_siblings(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Sports Day', image=make_image_file())
+
+        webp = photo.renditions['formats']['webp']
+        self.assertEqual(sorted(webp, key=int), ['320', '640', '1280', '1920', '2400'])
+        with Image.open(os.path.join(self.media_root, webp['2400'])) as transcoded:
+            self.assertEqual(transcoded.format, 'WEBP')
+
+        sources = dict(photo.get_image_sources())
+        self.assertIn('_2400w.webp 2400w', sources['image/webp'])
+
+    def test_sources_follow_configured_formats(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Sports Day', image=make_image_file())
+
+        with override_settings(IMAGE_RENDITION_FORMATS=['webp']):
+            sources = photo.get_image_sources()
+
+        self.assertEqual([mime_type for mime_type, srcset in sources], ['image/webp'])
+
+    def test_backfill_refreshes_cached_pages(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Sports Day', image=make_image_file())
+        BranchPhoto.objects.filter(pk=photo.pk).update(renditions={})
+        before = get_versions([campus_group('kadi'), 'home'])
+
+        call_command('generate_renditions', stdout=StringIO())
+
+        after = get_versions([campus_group('kadi'), 'home'])
+        self.assertNotEqual(before[campus_group('kadi')], after[campus_group('kadi')])
+        self.assertEqual(before['home'], after['home'])
+        photo.refresh_from_db()
+        self.assertEqual(photo.renditions['source'], photo.image.name)
+
+    def test_small_upload_is_not_upscaled(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Logo', image=make_image_file(size=(300, 200)))
+
+        self.assertEqual(photo.renditions['widths'], {})
+        self.assertEqual(photo.get_image_srcset(), '')
+
+    def test_remote_image_has_no_srcset(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Remote', image_url='https://example.com/photo.jpg')
+        self.assertEqual(photo.get_image_srcset(), '')
+
+    def test_delete_removes_renditions(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Library', image=make_image_file())
+        paths = [os.path.join(self.media_root, name) for name in photo.renditions['widths'].values()]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+
+        for path in paths:
+            self.assertFalse(os.path.exists(path))
+
+
+class BackgroundImageTaskTests(MediaTestCase):
+
+    def processing_callbacks(self, callbacks):
+        # Saves also queue a cache invalidation callback
+        return [callback for callback in callbacks if 'schedule_image_processing' in callback.__qualname__]
+
+    def test_processing_waits_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            photo = BranchPhoto.objects.create(campus_branch='kadi', title='Queued', image=make_image_file())
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.renditions, {})
+        self.assertEqual(len(self.processing_callbacks(callbacks)), 1)
+
+    def test_exif_is_stripped_without_reencoding(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'Camera Maker'
+        upload = make_image_file(size=(800, 600), exif=exif.tobytes())
+        source = Image.open(BytesIO(upload.read()))
+        upload.seek(0)
+
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Phone', image=upload)
+
+        with Image.open(photo.image.path) as original:
+            self.assertEqual(dict(original.getexif()), {0x0112: 6})
+            self.assertEqual(original.size, (800, 600))
+            self.assertIsNone(ImageChops.difference(source.convert('RGB'), original.convert('RGB')).getbbox())
+        # Renditions are still upright
+        with Image.open(os.path.join(self.media_root, photo.renditions['widths']['320'])) as rendition:
+            self.assertEqual(rendition.size, (320, 427))
+
+    def test_processing_never_runs_in_the_request(self):
+        # The broker is down: generate_renditions backfills them later
+        with override_settings(CELERY_TASK_ALWAYS_EAGER=False), \
+                mock.patch.object(process_uploaded_image, 'delay', side_effect=OSError('Connection refused')), \
+                mock.patch.object(process_uploaded_image, 'run') as run:
+            photo = self.create(BranchPhoto, campus_branch='kadi', title='Offline', image=make_image_file())
+
+        run.assert_not_called()
+        self.assertEqual(photo.renditions, {})
+
+    def test_editing_other_fields_does_not_requeue(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Library', image=make_image_file())
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            photo.title = 'Main Library'
+            photo.save()
+
+        self.assertEqual(self.processing_callbacks(callbacks), [])
+
+    def test_delete_removes_original_after_commit(self):
+        photo = self.create(BranchPhoto, campus_branch='kadi', title='Library', image=make_image_file())
+        path = photo.image.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+
+        self.assertFalse(os.path.exists(path))
+
+
+class PictureTagTests(MediaTestCase):
+
+    def render(self, template_string, **context):
+        return Template('{% load image_tags %}' + template_string).render(Context(context))
+
+    def test_picture_lists_modern_formats_before_fallback(self):
+        photo = self.create(BranchPhoto, campus_branch='iffco', title='Lab', image=make_image_file())
+
+        html = self.render('{% picture photo sizes="33vw" alt=photo.title data_title="Lab" %}', photo=photo)
+
+        self.assertTrue(html.startswith('<picture><source type="image/'))
+        self.assertIn('type="image/webp"', html)
+        self.assertLess(html.index('<source'), html.index('<img'))
+        self.assertIn(f'src="{photo.image.url}"', html)
+        self.assertIn('alt="Lab" data-title="Lab"', html)
+
+    def test_remote_image_renders_plain_img(self):
+        photo = self.create(BranchPhoto, campus_branch='iffco', title='Remote', image_url='https://example.com/a.jpg')
+
+        html = self.render('{% picture photo alt="Remote" %}', photo=photo)
+
+        self.assertEqual(html, '<img src="https://example.com/a.jpg" alt="Remote">')
+
+    def test_campus_gallery_page_uses_picture(self):
+        self.create(BranchPhoto, campus_branch='iffco', title='Lab', image=make_image_file())
+
+        response = self.client.get('/iffco/photos/')
+
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_celebration_pages_use_picture(self):
+        celebration = self.create(Celebration, festivalname='Holi', date='2024-03-25T00:00Z', image=make_image_file())
+        self.create(CelebrationPhoto, celebration=celebration, photo=make_image_file())
+
+        self.assertContains(self.client.get('/celebrations/'), '<source type="image/webp"')
+        # The card, then the modal's two slides and their thumbnails
+        self.assertContains(self.client.get('/gallery/'), '<source type="image/webp"', count=5)
+
+
+class GalleryViewQueryTests(TestCase):
+    """The gallery page must cost the same number of queries for any archive size"""
+
+    def add_galleries(self, count, images_per_gallery=3):
+        for index in range(count):
+            gallery = Gallery.objects.create(name=f'Gallery {Gallery.objects.count()}', category='festival')
+            for order in range(images_per_gallery):
+                GalleryImage.objects.create(
+                    gallery=gallery, order=order, image_url=f'https://example.com/{gallery.pk}/{order}.jpg'
+                )
+
+    def add_celebrations(self, count, photos_per_celebration=3):
+        for index in range(count):
+            celebration = Celebration.objects.create(
+                festivalname=f'Festival {index}', image_url='https://example.com/main.jpg', date='2024-01-01T00:00Z'
+            )
+            for order in range(photos_per_celebration):
+                CelebrationPhoto.objects.create(
+                    celebration=celebration, order=order, photo_url=f'https://example.com/{order}.jpg'
+                )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def count_queries(self, url):
+        # Bypass the site-wide page cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_gallery_queries_do_not_grow_with_galleries(self):
+        self.add_galleries(2)
+        small = self.count_queries('/gallery/')
+
+        self.add_galleries(20)
+        large = self.count_queries('/gallery/')
+
+        self.assertEqual(small, large)
+
+    def test_gallery_context_has_counts_and_images(self):
+        self.add_galleries(1, images_per_gallery=4)
+
+        response = self.client.get('/gallery/')
+
+        gallery = response.context['galleries'][0]
+        self.assertEqual(gallery.image_count, 4)
+        self.assertEqual([image.order for image in gallery.images], [0, 1, 2, 3])
+        self.assertContains(response, 'https://example.com/%d/0.jpg' % gallery.pk)
+
+    def test_celebration_fallback_queries_do_not_grow(self):
+        self.add_celebrations(2)
+        small = self.count_queries('/gallery/')
+
+        self.add_celebrations(20)
+        large = self.count_queries('/gallery/')
+
+        self.assertEqual(small, large)
+
+
+class GalleryPaginationTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Every gallery shares one timestamp so ordering relies on the id tie-breaker
+        self.created = timezone.now()
+        self.galleries = [
+            Gallery.objects.create(name=f'Gallery {index}', date_created=self.created)
+            for index in range(GALLERY_PAGE_SIZE + 3)
+        ]
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(self.created, 42)), (self.created, 42))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        self.assertIsNone(decode_cursor(''))
+
+    def test_first_page_links_to_next(self):
+        response = self.client.get('/gallery/')
+
+        self.assertEqual(len(response.context['galleries']), GALLERY_PAGE_SIZE)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, 'data-more-url="/gallery/more/?cursor=')
+
+    def test_fragment_returns_remaining_galleries(self):
+        first_page = self.client.get('/gallery/')
+        cursor = first_page.context['next_cursor']
+
+        data = self.client.get('/gallery/more/', {'cursor': cursor}).json()
+
+        self.assertIsNone(data['next_cursor'])
+        shown = [gallery.name for gallery in first_page.context['galleries']]
+        loaded = [gallery.name for gallery in self.galleries if f'>{gallery.name}</h3>' in data['html']]
+        self.assertEqual(len(loaded), 3)
+        self.assertFalse(set(shown) & set(loaded))
+
+    def test_fragment_respects_category(self):
+        Gallery.objects.create(name='Sports Meet', category='sports', date_created=self.created)
+
+        data = self.client.get('/gallery/more/', {'category': 'sports'}).json()
+
+        self.assertIn('Sports Meet', data['html'])
+        self.assertNotIn('Gallery 0', data['html'])
+        self.assertIsNone(data['next_cursor'])
+
+
+class CacheInvalidationTests(MediaTestCase):
+    """Model changes must refresh exactly the cached pages that show them"""
+
+    def add_photo(self, campus='kadi', title='Science Fair', **kwargs):
+        return self.create(
+            BranchPhoto, campus_branch=campus, title=title, is_featured=True,
+            image_url='https://example.com/photo.jpg', **kwargs
+        )
+
+    def test_campus_page_shows_new_photo_without_waiting(self):
+        self.assertNotContains(self.client.get('/kadi/'), 'Science Fair')
+
+        self.add_photo()
+
+        self.assertContains(self.client.get('/kadi/'), 'Science Fair')
+
+    def test_unrelated_pages_stay_cached(self):
+        before = get_versions(['home', campus_group('iffco'), campus_group('kadi')])
+
+        self.add_photo(campus='kadi')
+
+        after = get_versions(['home', campus_group('iffco'), campus_group('kadi')])
+        self.assertEqual(before['home'], after['home'])
+        self.assertEqual(before[campus_group('iffco')], after[campus_group('iffco')])
+        self.assertNotEqual(before[campus_group('kadi')], after[campus_group('kadi')])
+
+    def test_moving_photo_refreshes_both_campuses(self):
+        photo = self.add_photo(campus='kadi')
+        self.assertContains(self.client.get('/kadi/'), 'Science Fair')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.campus_branch = 'iffco'
+            photo.save()
+
+        self.assertNotContains(self.client.get('/kadi/'), 'Science Fair')
+        self.assertContains(self.client.get('/iffco/'), 'Science Fair')
+
+    def test_delete_refreshes_homepage_data(self):
+        image = self.create(CarouselImage, title='Welcome', image_url='https://example.com/slide.jpg')
+        self.assertContains(self.client.get('/'), 'https://example.com/slide.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+
+        self.assertNotContains(self.client.get('/'), 'https://example.com/slide.jpg')
+
+    def test_bulk_admin_action_refreshes_campus_page(self):
+        photo = self.add_photo(campus='kadi')
+        BranchPhoto.objects.filter(pk=photo.pk).update(is_featured=False)
+        self.assertNotContains(self.client.get('/kadi/'), 'Science Fair')
+        model_admin = admin_site._registry[BranchPhoto]
+        request = RequestFactory().post('/')
+
+        with mock.patch.object(model_admin, 'message_user'), self.captureOnCommitCallbacks(execute=True):
+            model_admin.mark_as_featured(request, BranchPhoto.objects.filter(pk=photo.pk))
+
+        self.assertContains(self.client.get('/kadi/'), 'Science Fair')
+
+    def test_browsers_revalidate_quickly(self):
+        response = self.client.get('/kadi/')
+
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertIsNotNone(cache.get(VERSION_KEY.format(campus_group('kadi'))))
+
+
+class CachedViewModelTests(MediaTestCase):
+    """Cached page data is plain data, so a cache hit costs no queries"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+
+    def test_home_cache_hit_is_query_free(self):
+        self.create(CarouselImage, title='Welcome', image_url='https://example.com/slide.jpg')
+        self.create(
+            Celebration, festivalname='Diwali', image=make_image_file(), date='2024-11-01T00:00Z'
+        )
+        home(self.factory.get('/'))
+
+        data, versions, fresh_until = cache.get('homepage_data')
+        self.assertEqual(data['carousel_images'][0]['url'], 'https://example.com/slide.jpg')
+        self.assertIn('320w', data['celebration'][0]['srcset'])
+
+        with self.assertNumQueries(0):
+            response = home(self.factory.get('/'))
+        self.assertContains(response, 'https://example.com/slide.jpg')
+        self.assertContains(response, 'Diwali')
+
+    def test_campus_cache_hit_is_query_free(self):
+        self.create(BranchPhoto, campus_branch='kadi', title='Library', is_featured=True, image=make_image_file())
+        kadi(self.factory.get('/kadi/'))
+
+        photos, versions, fresh_until = cache.get('kadi_featured_photos')
+        self.assertEqual([photo['title'] for photo in photos], ['Library'])
+        self.assertIsInstance(photos[0], dict)
+
+        with self.assertNumQueries(0):
+            response = kadi(self.factory.get('/kadi/'))
+        self.assertContains(response, '<source type="image/webp"')
+
+
+class SchemaRegistryTests(TestCase):
+
+    def test_known_tables_are_not_introspected_again(self):
+        reset_tables()
+        self.assertTrue(table_exists(Gallery))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(table_exists(Gallery))
+            self.assertTrue(table_exists(BranchPhoto))
+
+    def test_gallery_page_skips_introspection(self):
+        table_exists(Gallery)
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/gallery/')
+
+        self.assertFalse([query for query in context.captured_queries if 'sqlite_master' in query['sql']])
+
+
+class CampusGalleryTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for index in range(CAMPUS_PHOTOS_PER_PAGE + 2):
+            BranchPhoto.objects.create(
+                campus_branch='chattral', title=f'Classroom {index}', category='classroom',
+                image_url=f'https://example.com/{index}.jpg'
+            )
+        BranchPhoto.objects.create(
+            campus_branch='chattral', title='Sports Day', category='sports', image_url='https://example.com/sports.jpg'
+        )
+        BranchPhoto.objects.create(
+            campus_branch='kadi', title='Kadi Library', category='library', image_url='https://example.com/kadi.jpg'
+        )
+
+    def test_every_campus_has_a_gallery(self):
+        for campus, campus_name in BranchPhoto.CAMPUS_CHOICES:
+            response = self.client.get(f'/{campus}/photos/')
+            self.assertEqual(response.context['campus_name'], campus_name)
+
+    def test_page_costs_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/chattral/photos/', {'page': 2})
+
+        self.assertEqual(response.context['total_photos'], CAMPUS_PHOTOS_PER_PAGE + 3)
+        self.assertEqual(response.context['available_categories'], ['classroom', 'sports'])
+        self.assertEqual(len(response.context['photos']), 3)
+        self.assertNotContains(response, 'Kadi Library')
+
+    def test_category_filter(self):
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get('/chattral/photos/', {'category': 'sports'})
+
+        self.assertEqual(response.context['total_photos'], 1)
+        self.assertEqual([photo.title for photo in response.context['photos']], ['Sports Day'])
+        self.assertContains(response, 'href="/chattral/" class="back-btn"')
+
+
+class ConditionalGetTests(MediaTestCase):
+    """Repeat visits are answered with 304 until the page content changes"""
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get('/kadi/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get('/kadi/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_edit_changes_etag(self):
+        etag = self.client.get('/kadi/')['ETag']
+
+        self.create(BranchPhoto, campus_branch='kadi', title='Garden', is_featured=True, image_url='https://example.com/g.jpg')
+
+        response = self.client.get('/kadi/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Garden')
+
+    def test_other_campus_keeps_etag(self):
+        etag = self.client.get('/iffco/')['ETag']
+
+        self.create(BranchPhoto, campus_branch='kadi', title='Garden', image_url='https://example.com/g.jpg')
+
+        self.assertEqual(self.client.get('/iffco/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_view_answers_304_without_queries(self):
+        etag = self.client.get('/celebrations/')['ETag']
+        request = RequestFactory().get('/celebrations/', HTTP_IF_NONE_MATCH=etag)
+
+        with self.assertNumQueries(0):
+            response = celebrations(request)
+
+        self.assertEqual(response.status_code, 304)
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Anonymous cache hits are served before the session middleware runs"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_hit_skips_session_layer(self):
+        self.client.get('/celebrations/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/celebrations/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+
+    def test_session_cookie_bypasses_cache(self):
+        self.client.get('/celebrations/')
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'abc'
+
+        response = self.client.get('/celebrations/')
+
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+    def test_admin_is_never_cached(self):
+        response = self.client.get('/khs-secure-admin-2024/login/')
+
+        self.assertFalse(response.wsgi_request._cache_update_cache)
+
+
+class StampedeProtectionTests(TestCase):
+    """Only one worker rebuilds an expired entry, the others serve the stale copy"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def fail_build(self):
+        self.fail('Rebuilt while another worker held the lock')
+
+    def test_stale_value_served_while_rebuilding(self):
+        get_or_build('sample', lambda: 'old', ['home'])
+        bump_versions('home')
+        self.assertTrue(acquire_rebuild('sample'))
+
+        self.assertEqual(get_or_build('sample', self.fail_build, ['home']), 'old')
+
+    def test_stale_value_rebuilt_by_lock_holder(self):
+        get_or_build('sample', lambda: 'old', ['home'])
+        bump_versions('home')
+
+        self.assertEqual(get_or_build('sample', lambda: 'new', ['home']), 'new')
+        self.assertEqual(get_or_build('sample', self.fail_build, ['home']), 'new')
+
+    def test_page_served_stale_while_rebuilding(self):
+        Celebration.objects.create(festivalname='Holi', date='2024-03-25T00:00Z')
+        self.assertContains(self.client.get('/celebrations/'), 'Holi')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Celebration.objects.create(festivalname='Navratri', date='2024-10-03T00:00Z')
+        stale_key = stale_page_key(RequestFactory().get('/celebrations/'))
+        self.assertTrue(acquire_rebuild(stale_key))
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/celebrations/')
+        self.assertNotContains(response, 'Navratri')
+
+        release_rebuild(stale_key)
+        self.assertContains(self.client.get('/celebrations/'), 'Navratri')
+
+    def test_file_cache_lock(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+        }}):
+            self.assertTrue(acquire_rebuild('sample'))
+            self.assertFalse(acquire_rebuild('sample'))
+            release_rebuild('sample')
+            self.assertTrue(acquire_rebuild('sample'))
+            # A crashed worker's lock expires
+            lock_file, = os.listdir(cache_dir)
+            os.utime(os.path.join(cache_dir, lock_file), (0, 0))
+            self.assertTrue(acquire_rebuild('sample'))
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, SITE_URL='http://testserver')
+class CacheWarmingTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for index in range(CAMPUS_PHOTOS_PER_PAGE + 1):
+            BranchPhoto.objects.create(
+                campus_branch='kadi', title=f'Classroom {index}', category='classroom',
+                image_url=f'https://example.com/{index}.jpg'
+            )
+
+    def test_urls_cover_filters_and_pages(self):
+        urls = warm_urls()
+
+        self.assertIn('/', urls)
+        self.assertIn('/gallery/?category=festival', urls)
+        self.assertIn('/gallery/?branch=kadi', urls)
+        self.assertIn('/kadi/photos/?page=2', urls)
+        self.assertIn('/kadi/photos/?category=classroom&page=2', urls)
+        self.assertIn('/chattral/photos/', urls)
+        self.assertNotIn('/kadi/photos/?page=3', urls)
+
+    def test_warmed_pages_need_no_queries(self):
+        output = StringIO()
+        call_command('warm_cache', stdout=output)
+
+        self.assertIn('/kadi/photos/?category=classroom', output.getvalue())
+        with self.assertNumQueries(0):
+            response = self.client.get('/kadi/photos/', {'category': 'classroom', 'page': 2})
+        self.assertEqual(response.status_code, 200)
+
+    def feature_kadi_photos(self):
+        model_admin = admin_site._registry[BranchPhoto]
+        request = RequestFactory().post('/')
+        request._messages = CookieStorage(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            model_admin.mark_as_featured(request, BranchPhoto.objects.filter(campus_branch='kadi'))
+
+    def test_bulk_admin_action_queues_warming(self):
+        before = get_versions([campus_group('kadi')])[campus_group('kadi')]
+
+        with override_settings(CELERY_TASK_ALWAYS_EAGER=False), \
+                mock.patch.object(warm_page_cache, 'delay') as delay:
+            self.feature_kadi_photos()
+
+        self.assertGreater(get_versions([campus_group('kadi')])[campus_group('kadi')], before)
+        delay.assert_called_once_with()
+
+    def test_warming_never_runs_in_the_request(self):
+        # No worker, or the broker is down: pages fill the cache as they are visited
+        with override_settings(CELERY_TASK_ALWAYS_EAGER=True), \
+                mock.patch.object(warm_page_cache, 'run') as run:
+            self.feature_kadi_photos()
+        with override_settings(CELERY_TASK_ALWAYS_EAGER=False), \
+                mock.patch.object(warm_page_cache, 'delay', side_effect=OSError('Connection refused')), \
+                mock.patch.object(warm_page_cache, 'run') as broker_down_run:
+            self.feature_kadi_photos()
+
+        run.assert_not_called()
+        broker_down_run.assert_not_called()
+
+
+class PageSnapshotTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.snapshot_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_root, ignore_errors=True)
+        snapshot_override = override_settings(SNAPSHOT_ROOT=self.snapshot_root, SITE_URL='http://testserver')
+        snapshot_override.enable()
+        self.addCleanup(snapshot_override.disable)
+
+    def test_snapshot_matches_rendered_page(self):
+        call_command('build_snapshots', stdout=StringIO())
+
+        html = snapshot_path('/admissions/').read_bytes()
+        self.assertEqual(html, self.client.get('/admissions/').content)
+        self.assertEqual(gzip.decompress(snapshot_path('/admissions/').with_suffix('.html.gz').read_bytes()), html)
+
+    def test_only_content_free_pages(self):
+        built = [path for path, status, files in build_snapshots() if files]
+
+        self.assertIn('/blog/', built)
+        self.assertNotIn('/', built)
+        self.assertFalse(snapshot_path('/gallery/').exists())
+
+    def test_rebuild_drops_old_snapshots(self):
+        stale = snapshot_path('/removed-page/')
+        stale.parent.mkdir(parents=True)
+        stale.write_bytes(b'old')
+
+        build_snapshots()
+
+        self.assertFalse(stale.exists())
+
+
+class CompressedPageTests(TestCase):
+    """Cached pages are served with the precompressed body the browser accepts"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Celebration.objects.create(festivalname='Holi', date='2024-03-25T00:00Z')
+
+    def test_hit_served_precompressed(self):
+        identity = self.client.get('/celebrations/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/celebrations/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), identity.content)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], f'W/{identity["ETag"]}')
+
+    def test_miss_served_precompressed(self):
+        response = self.client.get('/celebrations/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertContains(self.client.get('/celebrations/'), 'Holi')
+        self.assertFalse(self.client.get('/celebrations/').has_header('Content-Encoding'))
+
+    def test_weak_etag_revalidates(self):
+        etag = self.client.get('/celebrations/', HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        response = self.client.get('/celebrations/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_accepted_encoding(self):
+        factory = RequestFactory()
+
+        def negotiate(header):
+            return accepted_encoding(factory.get('/', HTTP_ACCEPT_ENCODING=header), {'br': b'', 'gzip': b''})
+
+        self.assertEqual(negotiate('gzip, deflate, br'), 'br')
+        self.assertEqual(negotiate('br;q=0, gzip;q=0.5'), 'gzip')
+        self.assertEqual(negotiate('*'), 'br')
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate('gzip;q=0'))
+
+
+@override_settings(PERFORMANCE_LOG_SAMPLE_RATE=0, PERFORMANCE_LOG_SLOW_MS=60000)
+class ServerTimingTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Celebration.objects.create(festivalname='Holi', date='2024-03-25T00:00Z')
+
+    def timings(self, response):
+        return dict(metric.strip().split(';', 1) for metric in response['Server-Timing'].split(','))
+
+    def test_miss_then_hit(self):
+        miss = self.timings(self.client.get('/celebrations/'))
+        hit = self.timings(self.client.get('/celebrations/'))
+
+        self.assertNotIn('desc="0 queries"', miss['db'])
+        self.assertNotEqual(miss['tpl'], 'dur=0.0;desc="Templates"')
+        self.assertEqual(miss['cache'], 'desc="hits=0 misses=1"')
+        self.assertTrue(hit['db'].endswith('desc="0 queries"'))
+        self.assertEqual(hit['cache'], 'desc="hits=1 misses=0"')
+
+    def test_view_data_cache_counted(self):
+        # A session cookie bypasses the page cache, leaving the homepage data cache
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'abc'
+        self.client.get('/')
+
+        response = self.client.get('/')
+
+        self.assertEqual(self.timings(response)['cache'], 'desc="hits=1 misses=0"')
+
+    @override_settings(PERFORMANCE_LOG_SAMPLE_RATE=1)
+    def test_sampled_request_logged(self):
+        with self.assertLogs('khschool.performance') as logs:
+            self.client.get('/celebrations/')
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'celebrations')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['queries'], 0)
+        self.assertEqual(line['cache'], ['page:miss'])
+
+    def test_unsampled_request_not_logged(self):
+        with self.assertNoLogs('khschool.performance'):
+            self.client.get('/celebrations/')
+
+
+class BenchmarkDataTests(MediaTestCase):
+
+    def seed(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'seed_benchmark_data', photos_per_category=1, galleries=2, images_per_gallery=2, celebrations=1,
+                photos_per_celebration=1, image_size='96x64', stdout=StringIO(), **options
+            )
+
+    def test_seeds_every_campus_and_category(self):
+        self.seed()
+
+        expected = len(BranchPhoto.CAMPUS_CHOICES) * len(BranchPhoto.PHOTO_CATEGORY_CHOICES)
+        self.assertEqual(BranchPhoto.objects.count(), expected)
+        self.assertEqual(GalleryImage.objects.count(), 4)
+        self.assertEqual(CelebrationPhoto.objects.count(), 1)
+        self.assertTrue(BranchPhoto.objects.first().renditions)
+
+    def test_same_seed_same_images(self):
+        self.seed()
+        self.seed(force=True)
+
+        first, second = CarouselImage.objects.order_by('pk')[0], CarouselImage.objects.order_by('pk')[5]
+        self.assertEqual(first.image.read(), second.image.read())
+
+    def test_refuses_database_with_content(self):
+        Gallery.objects.create(name='Real gallery')
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsEndpointTests(MediaTestCase):
+
+    def scrape(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_and_cache_lookups(self):
+        self.client.get('/celebrations/')
+        self.client.get('/celebrations/')
+
+        metrics = self.scrape()
+
+        self.assertIn('khschool_request_duration_seconds_bucket{le="0.005",method="GET",route="celebrations"}', metrics)
+        self.assertIn('khschool_cache_lookups_total{cache="page",outcome="hit"}', metrics)
+        self.assertIn('khschool_db_queries_per_request_count{route="celebrations"}', metrics)
+        self.assertIn('khschool_task_queue_depth', metrics)
+
+    def test_upload_size(self):
+        self.create(BranchPhoto, campus_branch='kadi', title='Lab', image=make_image_file(size=(64, 48)))
+
+        self.assertIn('khschool_upload_size_bytes_count{model="BranchPhoto"}', self.scrape())
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+class AssetBundleTests(TestCase):
+
+    def render(self, source):
+        return Template('{% load asset_tags %}' + source).render(Context())
+
+    def test_links_sources_until_built(self):
+        html = self.render("{% css_bundle 'home' %}{% js_bundle 'site' %}")
+
+        self.assertInHTML('<link href="/static/css/base.css" rel="stylesheet">', html)
+        self.assertInHTML('<link href="/static/css/home.css" rel="stylesheet">', html)
+        self.assertInHTML('<script src="/static/js/navbar-fix.js" defer></script>', html)
+
+    def test_collectstatic_builds_hashed_bundles(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        storage = BundledStaticFilesStorage(location=static_root, base_url='/static/')
+        sources = {source for bundles in BUNDLES.values() for files in bundles.values() for source in files}
+        sources.update(VENDOR_FILES)
+        for source in sources:
+            with open(os.path.join(settings.STATICFILES_DIRS[0], source), 'rb') as source_file:
+                storage.save(source, source_file)
+
+        list(storage.post_process({source: (storage, source) for source in sources}))
+
+        with override_settings(STATIC_ROOT=static_root):
+            html = self.render("{% css_bundle 'home' %}{% js_bundle 'site' %}")
+        self.assertRegex(html, r'^<link href="/static/bundles/home\.[0-9a-f]{12}\.css" rel="stylesheet">'
+                               r'<script src="/static/bundles/site\.[0-9a-f]{12}\.js" defer></script>$')
+        with self.assertRaises(ValueError):
+            storage.url('css/missing.css')
+
+    def test_bundle_content(self):
+        storage = FileSystemStorage(location=settings.STATICFILES_DIRS[0])
+
+        js = bundle_content(storage, 'site', 'js')
+        css = bundle_content(storage, 'home', 'css')
+
+        self.assertIn('function initializeDropdownFixes()', js)
+        self.assertNotIn('/**', js)
+        self.assertIn('.celebration', css)
+        self.assertLess(len(css), sum(storage.size(source) for source in CSS_BUNDLES['home']))
+
+    def test_rebase_css_urls(self):
+        css = "a{background:url('../fonts/x.woff2')} b{background:url(data:image/png;base64,AA==)}"
+
+        rebased = rebase_css_urls(css, 'vendor/icons/css/icons.css', 'bundles/site.css')
+
+        self.assertIn("url('../vendor/icons/fonts/x.woff2')", rebased)
+        self.assertIn('url(data:image/png;base64,AA==)', rebased)
+
+    def test_purge_css(self):
+        css = (
+            '/*! License */.btn{a:1}.btn.show,.modal .toast{b:2}.btn:not(.active){c:3}'
+            '@media (min-width:576px){.toast{d:4}}@keyframes spin{from{e:5}}p{f:6}/*# sourceMappingURL=x.map */'
+        )
+
+        purged = purge_css(css, {'btn', 'show'})
+
+        self.assertEqual(
+            purged,
+            '/*! License */.btn{a:1}.btn.show{b:2}.btn:not(.active){c:3}@keyframes spin{from{e:5}}p{f:6}',
+        )
+
+    def test_framework_bundle_purged(self):
+        storage = FileSystemStorage(location=settings.STATICFILES_DIRS[0])
+
+        css = bundle_content(storage, 'framework', 'css')
+
+        self.assertIn('.navbar-expand-lg', css)
+        self.assertIn('.fa-bars:before', css)
+        self.assertNotIn('.offcanvas-header', css)
+        self.assertNotIn('.fa-500px:before', css)
+        self.assertIn("url('fonts/fontawesome-webfont.woff2')", css)
+        self.assertNotIn('.eot', css)
+        self.assertLess(len(icon_codepoints(css)), 100)
+
+    def test_vendored_files_match_integrity(self):
+        call_command('vendor_assets', '--check', stdout=StringIO())
+
+
+class CriticalCssTests(TestCase):
+
+    def render(self, source):
+        request = RequestFactory().get('/')
+        return Template('{% load asset_tags %}' + source).render(Context({'request': request}))
+
+    def test_fold_selectors(self):
+        fold = FoldParser(fold_elements=2)
+        fold.feed(
+            '<link href="/static/a.css" rel="stylesheet"><nav class="navbar" data-bs-theme="dark"></nav>'
+            '<main id="content"><h1 class="title">A</h1><p class="lead">B</p><footer class="footer"></footer></main>'
+        )
+        menu = FoldParser()
+        menu.feed('<ul class="dropdown-menu"><li><img src="a.png"><a class="dropdown-item">A</a></li></ul><p class="lead">B</p>')
+
+        self.assertEqual(fold.stylesheets, ['/static/a.css'])
+        self.assertTrue(fold.matches('.navbar[data-bs-theme=dark] .title'))
+        self.assertTrue(fold.matches('#content>p.lead::first-line'))
+        self.assertTrue(fold.matches(':root'))
+        self.assertFalse(fold.matches('.footer'))
+        self.assertFalse(fold.matches('.navbar:hover'))
+        self.assertFalse(fold.matches('[data-bs-target]'))
+        self.assertFalse(fold.matches('ul.navbar'))
+        self.assertTrue(menu.matches('.dropdown-menu'))
+        self.assertFalse(menu.matches('.dropdown-item'))
+        self.assertTrue(menu.matches('.lead'))
+
+    def test_critical_css(self):
+        css = critical_css(
+            '<link href="/static/css/home.css" rel="stylesheet"><main>'
+            '<section class="about-home-section"></section></main>'
+        )
+
+        self.assertIn('.about-home-section{', css)
+        self.assertNotIn('.gallery-card', css)
+
+    def test_critical_css_is_self_contained(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        os.makedirs(os.path.join(static_root, 'bundles'))
+        with open(os.path.join(static_root, 'bundles', 'page.css'), 'w') as stylesheet:
+            stylesheet.write(
+                ':root{--used:red;--chain:var(--used)}.hero{--unused:blue}'
+                '.hero{color:var(--chain);background:url(img/hero.png)}'
+                '@font-face{font-family:Icons;src:url("fonts/icons.woff2") format("woff2")}'
+                '.icon{background:url(data:image/gif;base64,R0lGOD)}'
+            )
+        html = '<link href="/static/bundles/page.css" rel="stylesheet"><main><div class="hero icon"></div></main>'
+
+        with override_settings(STATIC_ROOT=static_root):
+            css = critical_css(html)
+            over_budget = critical_css(html, budget=10)
+
+        self.assertIn('url(/static/bundles/img/hero.png)', css)
+        self.assertIn('url("/static/bundles/fonts/icons.woff2")', css)
+        self.assertIn('url(data:image/gif;base64,R0lGOD)', css)
+        self.assertIn('--chain:var(--used)', css)
+        self.assertIn('--used:red', css)
+        self.assertNotIn('--unused', css)
+        self.assertEqual(css.count('.hero{'), 1)
+        self.assertIsNone(over_budget)
+
+    def test_bundles_load_async_after_critical_css(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        os.makedirs(os.path.join(static_root, 'critical'))
+        with open(os.path.join(static_root, critical_path('home')), 'w') as critical_file:
+            critical_file.write('body{margin:0}')
+        source = "{% critical_css 'home' %}{% css_bundle 'carousel' %}"
+
+        with override_settings(STATIC_ROOT=static_root):
+            html = self.render(source)
+            with override_settings(DEBUG=True):
+                debug_html = self.render(source)
+
+        self.assertTrue(html.startswith('<style>body{margin:0}</style>'))
+        self.assertInHTML(
+            '<link rel="preload" href="/static/css/carousel.css" as="style" '
+            'onload="this.onload=null;this.rel=\'stylesheet\'">', html,
+        )
+        self.assertInHTML('<noscript><link href="/static/css/carousel.css" rel="stylesheet"></noscript>', html)
+        self.assertEqual(debug_html, '<link href="/static/css/carousel.css" rel="stylesheet">')
+
+
+class DocumentTests(TestCase):
+
+    def test_optimize_pdf(self):
+        with open(os.path.join(settings.STATICFILES_DIRS[0], 'documents', 'List of PTA.pdf'), 'rb') as source:
+            data = source.read()
+
+        optimized = optimize_pdf(data)
+
+        self.assertLess(len(optimized), len(data) / 2)
+        with pikepdf.open(BytesIO(optimized)) as pdf:
+            self.assertTrue(pdf.is_linearized)
+            self.assertEqual(len(pdf.pages), 1)
+        self.assertEqual(Image.open(BytesIO(render_preview(optimized))).width, PREVIEW_WIDTH)
+
+    def test_collectstatic_builds_documents(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        storage = BundledStaticFilesStorage(location=static_root, base_url='/static/')
+        sources = {source for bundles in BUNDLES.values() for files in bundles.values() for source in files}
+        sources.update(VENDOR_FILES)
+        for source in sources:
+            with open(os.path.join(settings.STATICFILES_DIRS[0], source), 'rb') as source_file:
+                storage.save(source, source_file)
+        paths = {source: (storage, source) for source in sources}
+        # collectstatic copies the documents and hands their source files over
+        source_storage = FileSystemStorage(location=settings.STATICFILES_DIRS[0])
+        for document in ('documents/noc.pdf', 'documents/No Objection Certificate.pdf'):
+            with source_storage.open('documents/waterhealth_certificate.pdf') as pdf:
+                storage.save(document, pdf)
+            paths[document] = (source_storage, 'documents/waterhealth_certificate.pdf')
+
+        list(storage.post_process(paths))
+
+        original, duplicate = storage.stored_name('documents/No Objection Certificate.pdf'), storage.stored_name('documents/noc.pdf')
+        self.assertEqual(original, duplicate)
+        self.assertFalse(storage.exists('documents/noc.pdf'))
+        self.assertFalse(storage.exists(f'{original}.gz'))
+        with storage.open(original) as pdf, pikepdf.open(pdf) as document:
+            self.assertTrue(document.is_linearized)
+
+        source = "{% load asset_tags %}{% document_preview 'documents/No Objection Certificate.pdf' %}"
+        with override_settings(STATIC_ROOT=static_root):
+            html = Template(source).render(Context())
+            with override_settings(DEBUG=True):
+                debug_html = Template(source).render(Context())
+        self.assertRegex(html, r'^<img src="/static/documents/previews/No Objection Certificate\.[0-9a-f]{12}\.webp"')
+        self.assertEqual(debug_html, '')
+
+
+class StaticImageTests(TestCase):
+
+    def test_optimize_png(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (3000, 1000), (0, 51, 99, 255)).save(buffer, 'PNG', compress_level=0, dpi=(300, 300))
+
+        optimized, webp = optimize_image(buffer.getvalue(), 'image/logo.png')
+
+        self.assertLess(len(optimized), len(buffer.getvalue()))
+        self.assertEqual(Image.open(BytesIO(optimized)).size, (MAX_IMAGE_SIZE, 853))
+        self.assertEqual(Image.open(BytesIO(webp)).format, 'WEBP')
+
+    def test_optimize_jpeg_keeps_pixels(self):
+        data = make_image_file(size=(400, 300), exif=Image.Exif()).read()
+
+        optimized, webp = optimize_image(data, 'image/campus.jpg')
+
+        original = Image.open(BytesIO(data))
+        result = Image.open(BytesIO(optimized or data))
+        self.assertEqual(result.size, original.size)
+        self.assertLess(max(ImageStat.Stat(ImageChops.difference(original, result)).mean), 1)
+        self.assertLess(len(webp), len(optimized or data))
+
+    def test_optimize_svg(self):
+        svg = (
+            '<?xml version="1.0" encoding="UTF-16"?>\n<!-- Creator: CorelDRAW -->\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">\n'
+            '  <path d="M10.123456789 10.123456789 L90.987654321 90.987654321"/>\n</svg>\n'
+        )
+
+        optimized, webp = optimize_image(svg.encode('utf-16'), 'image/logo.svg')
+
+        self.assertIsNone(webp)
+        text = optimized.decode('utf-8')
+        self.assertNotIn('CorelDRAW', text)
+        self.assertNotIn('UTF-16', text)
+        self.assertIn('10.123', text)
+        self.assertNotIn('10.123456789', text)
+
+    def test_wrong_format_left_alone(self):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'GIF')
+
+        self.assertEqual(optimize_image(buffer.getvalue(), 'images/placeholder.jpg'), (None, None))
+        self.assertEqual(optimize_image(b'<svg xmlns="http://www.w3.org/2000/svg"/>', 'favicon/logo.png'), (None, None))
+
+    def test_collectstatic_writes_webp_siblings(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        storage = BundledStaticFilesStorage(location=static_root, base_url='/static/')
+        sources = {source for bundles in BUNDLES.values() for files in bundles.values() for source in files}
+        sources.update(VENDOR_FILES)
+        sources.add('image/campus_memnagar.jpg')
+        for source in sources:
+            with open(os.path.join(settings.STATICFILES_DIRS[0], source), 'rb') as source_file:
+                storage.save(source, source_file)
+
+        with self.assertLogs('khschool.static_images') as logs:
+            list(storage.post_process({source: (storage, source) for source in sources}))
+
+        self.assertIn('INFO:khschool.static_images:image/campus_memnagar.jpg: 28 KB -> 25 KB (WebP 17 KB)', logs.output)
+        with override_settings(STATIC_ROOT=static_root):
+            html = Template(
+                "{% load image_tags %}{% static_picture 'image/campus_memnagar.jpg' alt='Campus' class='img-fluid' %}"
+            ).render(Context())
+        self.assertRegex(html, (
+            r'^<picture><source type="image/webp" srcset="/static/image/campus_memnagar\.jpg\.[0-9a-f]{12}\.webp" '
+            r'sizes="100vw"><img src="/static/image/campus_memnagar\.[0-9a-f]{12}\.jpg" alt="Campus" class="img-fluid">'
+            r'</picture>$'
+        ))
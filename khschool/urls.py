@@ -1,8 +1,10 @@
 from django.urls import path
 from. import views
+from .models import BranchPhoto
 urlpatterns = [
     path('', views.home,name='home'),
     path('gallery/',views.gallery,name='gallery'),
+    path('gallery/more/',views.gallery_more,name='gallery_more'),
     path('contact/',views.contact,name='contact'),
     path('brief/',views.brief,name='brief'),
     path('aboutSchool/',views.aboutSchool,name='aboutSchool'),
@@ -30,11 +32,11 @@ urlpatterns = [
     path('institutional-goals/', views.institutional_goals, name='institutional_goals'),
     path('team/', views.team, name='team'),
     
-    # Campus gallery URLs
-    path('chandkheda/photos/',views.chandkheda_gallery_view,name='chandkheda_gallery'),
-    path('chattral/photos/',views.chattral_gallery_view,name='chattral_gallery'),
-    path('iffco/photos/',views.iffco_gallery_view,name='iffco_gallery'),
-    path('kadi/photos/',views.kadi_gallery_view,name='kadi_gallery'),
+    # Campus gallery URLs, one per campus in BranchPhoto.CAMPUS_CHOICES
+    *[
+        path(f'{campus}/photos/',views.campus_gallery_view,{'campus': campus},name=f'{campus}_gallery')
+        for campus, campus_name in BranchPhoto.CAMPUS_CHOICES
+    ],
     
     path('image-test/',views.image_test,name='image_test'),
 ]
@@ -0,0 +1,56 @@
+"""
+Plain-data view models for cached page context.
+
+Cached contexts hold small dicts with exactly what the templates render
+(titles, URLs, srcsets) instead of model instances or lazy QuerySets, so
+the cache entries stay compact and a cache hit needs no database queries.
+The image keys (``url``, ``srcset``, ``sources``) are also understood by
+the ``{% picture %}`` tag.
+"""
+
+
+def image_data(obj, field_name):
+    """Return the url, srcset and <source> candidates of one model image"""
+    return {
+        'url': getattr(obj, f'get_{field_name}_url')(),
+        'srcset': getattr(obj, f'get_{field_name}_srcset')(),
+        'sources': getattr(obj, f'get_{field_name}_sources')(),
+    }
+
+
+def carousel_slide(image):
+    """View model for a CarouselImage slide"""
+    return {
+        'title': image.title,
+        'subtitle': image.subtitle,
+        'button_text': image.button_text,
+        'button_link': image.button_link,
+        **image_data(image, 'image'),
+    }
+
+
+def celebration_card(celebration):
+    """View model for a Celebration card on the homepage"""
+    return {
+        'festivalname': celebration.festivalname,
+        'celebration_type': celebration.celebration_type,
+        'date': celebration.date,
+        **image_data(celebration, 'image'),
+    }
+
+
+def gallery_card(gallery):
+    """View model for a featured Gallery (thumbnail falls back to its first image)"""
+    return {
+        'name': gallery.name,
+        'category': gallery.category,
+        **image_data(gallery, 'thumbnail'),
+    }
+
+
+def campus_photo(photo):
+    """View model for a featured BranchPhoto on a campus page"""
+    return {
+        'title': photo.title,
+        **image_data(photo, 'image'),
+    }
@@ -1,97 +1,126 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
-from django.views.decorators.cache import cache_page
-from .models import Celebration, CarouselImage, Gallery, GalleryImage, BranchPhoto
-from django.core.paginator import Paginator
+from .models import Celebration, CelebrationPhoto, CarouselImage, Gallery, GalleryImage, BranchPhoto
+from django.template.loader import render_to_string
+from django.urls import NoReverseMatch, reverse
+from django.utils.http import urlencode
 from django.db.models import Prefetch, Count, Q
 from django.contrib import messages
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from .caching import campus_group, content_condition, get_or_build
+from .metrics import render_metrics
+from .pagination import CountedPaginator, keyset_page
+from .schema import table_exists
+from .viewmodels import campus_photo, carousel_slide, celebration_card, gallery_card
 import logging
 
 # Setup logger
 logger = logging.getLogger(__name__)
-@cache_page(60 * 15)  # Cache for 15 minutes
-def home(request):
-    # Use cache key for expensive queries
-    cache_key = 'homepage_data'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return render(request, 'home.html', cached_data)
-    
+def homepage_context():
+    """Build the homepage context (cached as plain data by home())"""
     # Set default empty values
     carousel_images = []
     celebrations = []
     featured_galleries = []
     
-    # Check if the tables exist in the database
-    from django.db import connection
-    tables = connection.introspection.table_names()
-    
-    # Only try to query if the tables exist
-    if 'khschool_carouselimage' in tables:
+    # Only try to query if the tables exist (e.g. before migrate on a fresh deploy)
+    if table_exists(CarouselImage):
         try:
-            carousel_images = CarouselImage.objects.filter(is_active=True).order_by('order')
-            print(f"DEBUG: Found {len(carousel_images)} carousel images")
-            for img in carousel_images:
-                print(f"DEBUG: Carousel image - ID: {img.id}, Title: {img.title}, Image: {img.image}, URL: {img.get_image_url()}")
-        except Exception as e:
+            carousel_images = [
+                carousel_slide(image) for image in CarouselImage.objects.filter(is_active=True).order_by('order')
+            ]
+        except Exception:
             # Log the error but continue with empty list
-            print(f"Error loading carousel images: {str(e)}")
+            logger.exception("Error loading carousel images")
     
     # Try to get featured galleries first with optimized query
-    if 'khschool_gallery' in tables:
+    if table_exists(Gallery):
         try:
-            featured_galleries = Gallery.objects.filter(
-                is_featured=True
-            ).prefetch_related(
-                Prefetch(
-                    'galleryimage_set',
-                    queryset=GalleryImage.objects.order_by('order')[:4],
-                    to_attr='sample_images'
-                )
-            ).order_by('-date_created')[:3]
-        except Exception as e:
+            # The thumbnail fallback (first image) comes from the prefetch;
+            # a sliced prefetch needs to_attr (see Gallery.first_image)
+            featured_galleries = [
+                gallery_card(gallery) for gallery in Gallery.objects.filter(
+                    is_featured=True
+                ).prefetch_related(
+                    Prefetch(
+                        'galleryimage_set',
+                        queryset=GalleryImage.objects.order_by('order', '-date_added')[:1],
+                        to_attr='preview_images'
+                    )
+                ).order_by('-date_created')[:3]
+            ]
+        except Exception:
             # Log the error but continue with empty list
-            print(f"Error loading featured galleries: {str(e)}")
+            logger.exception("Error loading featured galleries")
     
     # If no featured galleries, fall back to celebrations
-    if not featured_galleries and 'khschool_celebration' in tables:
+    if not featured_galleries and table_exists(Celebration):
         try:
-            celebrations = Celebration.objects.select_related().order_by('-date')[:3]
-        except Exception as e:
+            celebrations = [
+                celebration_card(celebration) for celebration in Celebration.objects.order_by('-date')[:3]
+            ]
+        except Exception:
             # Log the error but continue with empty list
-            print(f"Error loading celebrations: {str(e)}")
+            logger.exception("Error loading celebrations")
         
-    context = {
+    return {
         'carousel_images': carousel_images,
         'celebration': celebrations,
         'featured_galleries': featured_galleries
     }
-    
-    # Cache the context for 15 minutes
-    cache.set(cache_key, context, 60 * 15)
-    
+
+@content_condition
+def home(request):
+    # Cached until a homepage model changes, rebuilt by one worker at a time
+    context = get_or_build('homepage_data', homepage_context, ['home'])
     return render(request, 'home.html', context)
 
+# Galleries per page on the gallery index (and per infinite-scroll fragment)
+GALLERY_PAGE_SIZE = 12
+
+def gallery_page(category_filter=None, cursor=None):
+    """
+    Return one keyset page of galleries (newest first) and the cursor of the next page.
+    Galleries come with image counts and their images prefetched, so a page
+    costs the same small number of queries however many galleries exist.
+    """
+    galleries = Gallery.objects.all()
+    if category_filter and category_filter != 'all':
+        galleries = galleries.filter(category=category_filter)
+    
+    # get_thumbnail_url() reuses the prefetched images for its fallback
+    galleries = galleries.annotate(
+        image_count=Count('galleryimage')
+    ).prefetch_related(
+        Prefetch(
+            'galleryimage_set',
+            queryset=GalleryImage.objects.order_by('order', '-date_added')
+        )
+    )
+    galleries, next_cursor = keyset_page(galleries, cursor, GALLERY_PAGE_SIZE)
+    for gallery in galleries:
+        gallery.images = list(gallery.galleryimage_set.all())
+    return galleries, next_cursor
+
 #gallery page
+@content_condition
 def gallery(request):
     # Get filter parameters
     category_filter = request.GET.get('category', None)
     branch_filter = request.GET.get('branch', None)
-    
-    # Check if the tables exist in the database
-    from django.db import connection
-    tables = connection.introspection.table_names()
+    cursor = request.GET.get('cursor', None)
     
     # Initialize variables
     galleries = []
+    next_cursor = None
     branch_photos = []
+    branch_gallery_url = None
     celebrations = []
     
     # Get branch photos if branch filter is provided
-    if branch_filter and 'khschool_branchphoto' in tables:
+    if branch_filter and table_exists(BranchPhoto):
         try:
             # Get branch photos with optional category filter
             branch_photos_query = BranchPhoto.objects.filter(campus_branch=branch_filter)
@@ -99,50 +128,45 @@ def gallery(request):
             if category_filter and category_filter != 'all':
                 branch_photos_query = branch_photos_query.filter(category=category_filter)
             
-            branch_photos = branch_photos_query.order_by('order', '-date_uploaded')
+            # A first page only, the campus photo gallery pages through the rest
+            branch_photos = list(branch_photos_query.order_by('order', '-date_uploaded')[:CAMPUS_PHOTOS_PER_PAGE])
+            try:
+                branch_gallery_url = reverse(f'{branch_filter}_gallery')
+            except NoReverseMatch:
+                branch_gallery_url = None
+            if branch_gallery_url and category_filter and category_filter != 'all':
+                branch_gallery_url += '?' + urlencode({'category': category_filter})
             
-        except Exception as e:
-            print(f"Error loading branch photos: {str(e)}")
+        except Exception:
+            logger.exception("Error loading branch photos")
             branch_photos = []
     
     # Only try to query galleries if no branch filter or as additional content
-    if not branch_filter and 'khschool_gallery' in tables:
+    if not branch_filter and table_exists(Gallery):
         try:
-            # Get galleries with optional category filter
-            if category_filter and category_filter != 'all':
-                galleries = Gallery.objects.filter(category=category_filter).order_by('-date_created')
-            else:
-                galleries = Gallery.objects.all().order_by('-date_created')
-            
-            # For each gallery, get its images
-            for gallery in galleries:
-                try:
-                    images = gallery.galleryimage_set.all().order_by('order', '-date_added')
-                    gallery.images = list(images)
-                    gallery.image_count = len(gallery.images)
-                except Exception as e:
-                    print(f"Error loading images for gallery {gallery.id}: {str(e)}")
-                    gallery.images = []
-                    gallery.image_count = 0
-        except Exception as e:
-            print(f"Error loading galleries: {str(e)}")
+            # First page of galleries, the rest is loaded by gallery_more on scroll
+            galleries, next_cursor = gallery_page(category_filter, cursor)
+        except Exception:
+            logger.exception("Error loading galleries")
             galleries = []
     
     # For backward compatibility - also get celebrations if there are no galleries and no branch photos
-    if not galleries and not branch_photos and 'khschool_celebration' in tables:
+    if not galleries and not branch_photos and not cursor and table_exists(Celebration):
         try:
-            celebrations = Celebration.objects.all().order_by('-date')
+            celebrations = list(
+                Celebration.objects.annotate(
+                    photo_count=Count('celebrationphoto')
+                ).prefetch_related(
+                    Prefetch(
+                        'celebrationphoto_set',
+                        queryset=CelebrationPhoto.objects.order_by('order')
+                    )
+                ).order_by('-date')
+            )
             for celebration in celebrations:
-                try:
-                    photos = celebration.celebrationphoto_set.all().order_by('order')
-                    celebration.additional_photos = list(photos)
-                    celebration.photo_count = len(celebration.additional_photos)
-                except Exception as e:
-                    print(f"Error loading additional photos for celebration {celebration.id}: {str(e)}")
-                    celebration.additional_photos = []
-                    celebration.photo_count = 0
-        except Exception as e:
-            print(f"Error loading celebrations: {str(e)}")
+                celebration.additional_photos = list(celebration.celebrationphoto_set.all())
+        except Exception:
+            logger.exception("Error loading celebrations")
             celebrations = []
     
     # Get all available categories for the filter
@@ -156,11 +180,13 @@ def gallery(request):
         categories = list(branch_categories)  # Use branch categories when viewing branch photos
     
     # Get available branches
-    branches = [choice[0] for choice in BranchPhoto.CAMPUS_CHOICES] if 'khschool_branchphoto' in tables else []
+    branches = [choice[0] for choice in BranchPhoto.CAMPUS_CHOICES] if table_exists(BranchPhoto) else []
     
     context = {
         'galleries': galleries,
+        'next_cursor': next_cursor,
         'branch_photos': branch_photos,
+        'branch_gallery_url': branch_gallery_url,
         'celebration': celebrations,  # Keep for backward compatibility
         'categories': categories,
         'branches': branches,
@@ -171,6 +197,17 @@ def gallery(request):
     
     return render(request, 'gallery.html', context)
 
+@content_condition
+def gallery_more(request):
+    """JSON fragment with the next page of galleries for infinite scroll"""
+    category_filter = request.GET.get('category', None)
+    galleries, next_cursor = gallery_page(category_filter, request.GET.get('cursor', None))
+    
+    return JsonResponse({
+        'html': render_to_string('gallery_items.html', {'galleries': galleries}, request=request),
+        'next_cursor': next_cursor,
+    })
+
 #contact page
 def contact(request):
     return render(request,'contact.html')
@@ -183,20 +220,21 @@ def brief(request):
 def aboutSchool(request):
     return render(request,'aboutSchool.html')
 
+def featured_campus_photos(campus):
+    """Featured photos of a campus page, cached as plain data until they change"""
+    def build():
+        return [
+            campus_photo(photo) for photo in BranchPhoto.objects.filter(
+                campus_branch=campus,
+                is_featured=True
+            ).order_by('order', '-date_uploaded')[:5]
+        ]
+    return get_or_build(f'{campus}_featured_photos', build, [campus_group(campus)])
+
 #memnagar campus page
-@cache_page(60 * 10)  # Cache for 10 minutes
+@content_condition
 def chandkheda(request):
-    # Use cache for featured photos
-    cache_key = 'chandkheda_featured_photos'
-    featured_photos = cache.get(cache_key)
-    
-    if featured_photos is None:
-        # Get featured photos from BranchPhoto model
-        featured_photos = BranchPhoto.objects.filter(
-            campus_branch='chandkheda',
-            is_featured=True
-        ).order_by('order', '-date_uploaded')[:5]
-        cache.set(cache_key, featured_photos, 60 * 10)  # Cache for 10 minutes
+    featured_photos = featured_campus_photos('chandkheda')
     
     context = {
         'campus_name': 'Chandkheda Campus',
@@ -204,51 +242,9 @@ def chandkheda(request):
     }
     return render(request, 'chandkheda.html', context)
 
-@cache_page(60 * 5)  # Cache for 5 minutes
-def chandkheda_gallery_view(request):
-    # Get all photos for Chandkheda campus using BranchPhoto model with pagination
-    all_photos = BranchPhoto.objects.filter(
-        campus_branch='chandkheda'
-    ).order_by('order', '-date_uploaded')
-    
-    # Add pagination (18 photos per page for nice 3x6 grid)
-    paginator = Paginator(all_photos, 18)
-    page_number = request.GET.get('page')
-    photos = paginator.get_page(page_number)
-    
-    # Get category filter if provided
-    category_filter = request.GET.get('category')
-    if category_filter and category_filter != 'all':
-        all_photos = all_photos.filter(category=category_filter)
-        paginator = Paginator(all_photos, 18)
-        photos = paginator.get_page(page_number)
-    
-    # Get available categories for filtering
-    available_categories = BranchPhoto.objects.filter(
-        campus_branch='chandkheda'
-    ).values_list('category', flat=True).distinct()
-    
-    context = {
-        'campus_name': 'Chandkheda Campus',
-        'photos': photos,
-        'available_categories': available_categories,
-        'current_category': category_filter or 'all',
-        'total_photos': all_photos.count(),
-    }
-    return render(request, 'campus_gallery.html', context)
-
-@cache_page(60 * 10)  # Cache for 10 minutes
+@content_condition
 def chattral(request):
-    cache_key = 'chattral_featured_photos'
-    featured_photos = cache.get(cache_key)
-    
-    if featured_photos is None:
-        # Use BranchPhoto model for featured photos
-        featured_photos = BranchPhoto.objects.filter(
-            campus_branch='chattral',
-            is_featured=True
-        ).order_by('order', '-date_uploaded')[:5]
-        cache.set(cache_key, featured_photos, 60 * 10)
+    featured_photos = featured_campus_photos('chattral')
     
     context = {
         'campus_name': 'Chattral Campus',
@@ -256,51 +252,9 @@ def chattral(request):
     }
     return render(request, 'chattral.html', context)
 
-@cache_page(60 * 5)  # Cache for 5 minutes
-def chattral_gallery_view(request):
-    # Get all photos for Chattral campus using BranchPhoto model with pagination
-    all_photos = BranchPhoto.objects.filter(
-        campus_branch='chattral'
-    ).order_by('order', '-date_uploaded')
-    
-    # Add pagination
-    paginator = Paginator(all_photos, 18)
-    page_number = request.GET.get('page')
-    photos = paginator.get_page(page_number)
-    
-    # Get category filter if provided
-    category_filter = request.GET.get('category')
-    if category_filter and category_filter != 'all':
-        all_photos = all_photos.filter(category=category_filter)
-        paginator = Paginator(all_photos, 18)
-        photos = paginator.get_page(page_number)
-    
-    # Get available categories for filtering
-    available_categories = BranchPhoto.objects.filter(
-        campus_branch='chattral'
-    ).values_list('category', flat=True).distinct()
-    
-    context = {
-        'campus_name': 'Chattral Campus',
-        'photos': photos,
-        'available_categories': available_categories,
-        'current_category': category_filter or 'all',
-        'total_photos': all_photos.count(),
-    }
-    return render(request, 'campus_gallery.html', context)
-
-@cache_page(60 * 10)  # Cache for 10 minutes
+@content_condition
 def iffco(request):
-    cache_key = 'iffco_featured_photos'
-    featured_photos = cache.get(cache_key)
-    
-    if featured_photos is None:
-        # Use BranchPhoto model for featured photos
-        featured_photos = BranchPhoto.objects.filter(
-            campus_branch='iffco',
-            is_featured=True
-        ).order_by('order', '-date_uploaded')[:5]
-        cache.set(cache_key, featured_photos, 60 * 10)
+    featured_photos = featured_campus_photos('iffco')
     
     context = {
         'campus_name': 'IFFCO Campus',
@@ -308,51 +262,9 @@ def iffco(request):
     }
     return render(request, 'iffco.html', context)
 
-@cache_page(60 * 5)  # Cache for 5 minutes
-def iffco_gallery_view(request):
-    # Get all photos for IFFCO campus using BranchPhoto model with pagination
-    all_photos = BranchPhoto.objects.filter(
-        campus_branch='iffco'
-    ).order_by('order', '-date_uploaded')
-    
-    # Add pagination
-    paginator = Paginator(all_photos, 18)
-    page_number = request.GET.get('page')
-    photos = paginator.get_page(page_number)
-    
-    # Get category filter if provided
-    category_filter = request.GET.get('category')
-    if category_filter and category_filter != 'all':
-        all_photos = all_photos.filter(category=category_filter)
-        paginator = Paginator(all_photos, 18)
-        photos = paginator.get_page(page_number)
-    
-    # Get available categories for filtering
-    available_categories = BranchPhoto.objects.filter(
-        campus_branch='iffco'
-    ).values_list('category', flat=True).distinct()
-    
-    context = {
-        'campus_name': 'IFFCO Campus',
-        'photos': photos,
-        'available_categories': available_categories,
-        'current_category': category_filter or 'all',
-        'total_photos': all_photos.count(),
-    }
-    return render(request, 'campus_gallery.html', context)
-
-@cache_page(60 * 10)  # Cache for 10 minutes
+@content_condition
 def kadi(request):
-    cache_key = 'kadi_featured_photos'
-    featured_photos = cache.get(cache_key)
-    
-    if featured_photos is None:
-        # Use BranchPhoto model for featured photos
-        featured_photos = BranchPhoto.objects.filter(
-            campus_branch='kadi',
-            is_featured=True
-        ).order_by('order', '-date_uploaded')[:5]
-        cache.set(cache_key, featured_photos, 60 * 10)
+    featured_photos = featured_campus_photos('kadi')
     
     context = {
         'campus_name': 'Kadi Campus',
@@ -360,36 +272,54 @@ def kadi(request):
     }
     return render(request, 'kadi.html', context)
 
-@cache_page(60 * 5)  # Cache for 5 minutes
-def kadi_gallery_view(request):
-    # Get all photos for Kadi campus using BranchPhoto model with pagination
-    all_photos = BranchPhoto.objects.filter(
-        campus_branch='kadi'
-    ).order_by('order', '-date_uploaded')
+# Photos per page on the campus photo galleries (3x6 grid)
+CAMPUS_PHOTOS_PER_PAGE = 18
+
+@content_condition
+def campus_gallery_view(request, campus):
+    """
+    Photo gallery of one campus. Routed for every campus in
+    BranchPhoto.CAMPUS_CHOICES (see urls.py), so a new branch needs no code.
+    A page costs two queries: the category counts and the page of photos.
+    """
+    campus_names = dict(BranchPhoto.CAMPUS_CHOICES)
+    if campus not in campus_names:
+        raise Http404("Unknown campus")
+    
+    photos = BranchPhoto.objects.filter(campus_branch=campus)
     
-    # Add pagination
-    paginator = Paginator(all_photos, 18)
-    page_number = request.GET.get('page')
-    photos = paginator.get_page(page_number)
+    # One grouped query gives the filter buttons and the photo totals
+    category_counts = dict(
+        photos.order_by().values_list('category').annotate(count=Count('pk'))
+    )
     
     # Get category filter if provided
     category_filter = request.GET.get('category')
     if category_filter and category_filter != 'all':
-        all_photos = all_photos.filter(category=category_filter)
-        paginator = Paginator(all_photos, 18)
-        photos = paginator.get_page(page_number)
+        photos = photos.filter(category=category_filter)
+        total_photos = category_counts.get(category_filter, 0)
+    else:
+        total_photos = sum(category_counts.values())
     
-    # Get available categories for filtering
-    available_categories = BranchPhoto.objects.filter(
-        campus_branch='kadi'
-    ).values_list('category', flat=True).distinct()
+    paginator = CountedPaginator(
+        photos.order_by('order', '-date_uploaded'), CAMPUS_PHOTOS_PER_PAGE, count=total_photos
+    )
+    page = paginator.get_page(request.GET.get('page'))
+    
+    # Campuses without their own landing page link back home
+    try:
+        campus_url = reverse(campus)
+    except NoReverseMatch:
+        campus_url = reverse('home')
     
     context = {
-        'campus_name': 'Kadi Campus',
-        'photos': photos,
-        'available_categories': available_categories,
+        'campus': campus,
+        'campus_name': campus_names[campus],
+        'campus_url': campus_url,
+        'photos': page,
+        'available_categories': sorted(category_counts),
         'current_category': category_filter or 'all',
-        'total_photos': all_photos.count(),
+        'total_photos': total_photos,
     }
     return render(request, 'campus_gallery.html', context)
 
@@ -429,15 +359,17 @@ def facilities(request):
 def activities(request):
     return render(request, 'activities.html')
 
+@content_condition
 def celebrations(request):
     # Get celebrations from database if available
     celebrations = []
     try:
-        celebrations = Celebration.objects.all().order_by('-date')
-        for celebration in celebrations:
-            celebration.additional_photos = celebration.celebrationphoto_set.all().order_by('order')
-    except Exception as e:
-        print(f"Error loading celebrations: {str(e)}")
+        # The page only shows how many extra photos each celebration has
+        celebrations = Celebration.objects.annotate(
+            photo_count=Count('celebrationphoto')
+        ).order_by('-date')
+    except Exception:
+        logger.exception("Error loading celebrations")
     
     context = {
         'celebrations': celebrations
@@ -473,3 +405,16 @@ def institutional_goals(request):
 
 def team(request):
     return render(request, 'team.html')
+
+def metrics(request):
+    """Prometheus metrics of every worker, for scrapers sending METRICS_TOKEN as a bearer token"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Disabled until a token is configured
+        raise Http404
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden('Invalid metrics token')
+    body, content_type = render_metrics()
+    response = HttpResponse(body, content_type=content_type)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,110 @@
+"""
+Cache warming.
+
+Requests every public page once, in-process through the project's WSGI
+handler and its full middleware stack, so the shared page cache and the view data caches are filled before
+visitors arrive (after a deploy or a bulk edit in the admin). Pages are
+requested as an anonymous visitor of SITE_URL, because the host and scheme
+are part of the page cache key.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache as memoize
+from urllib.parse import urlencode, urlsplit
+import math
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.core.handlers.wsgi import WSGIHandler
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .models import BranchPhoto, Gallery
+from .views import CAMPUS_PHOTOS_PER_PAGE
+
+# Routes that are not public pages (login only, or need a scroll cursor)
+SKIPPED_ROUTES = {'image_test', 'gallery_more'}
+
+
+def _with_query(path, **params):
+    params = {key: value for key, value in params.items() if value}
+    return f'{path}?{urlencode(params)}' if params else path
+
+
+def warm_urls():
+    """
+    Return the path of every public page: all named routes in
+    khschool/urls.py, the gallery category and campus filters, and every
+    page of every campus photo gallery and its category filters.
+    """
+    from .urls import urlpatterns
+
+    paths = [
+        reverse(pattern.name)
+        for pattern in urlpatterns
+        if pattern.name and pattern.name not in SKIPPED_ROUTES
+    ]
+
+    gallery_path = reverse('gallery')
+    paths += [_with_query(gallery_path, category=category) for category, label in Gallery.CATEGORY_CHOICES]
+    paths += [_with_query(gallery_path, branch=campus) for campus, name in BranchPhoto.CAMPUS_CHOICES]
+
+    # Same grouped counts as the campus gallery view
+    counts = {}
+    for campus, category, count in BranchPhoto.objects.order_by().values_list(
+        'campus_branch', 'category'
+    ).annotate(count=Count('pk')):
+        counts.setdefault(campus, {})[category] = count
+
+    for campus, name in BranchPhoto.CAMPUS_CHOICES:
+        campus_path = reverse(f'{campus}_gallery')
+        categories = counts.get(campus, {})
+        filters = [(None, sum(categories.values()))] + sorted(categories.items())
+        for category, total in filters:
+            pages = max(1, math.ceil(total / CAMPUS_PHOTOS_PER_PAGE))
+            paths += [
+                _with_query(campus_path, category=category, page=page if page > 1 else None)
+                for page in range(1, pages + 1)
+            ]
+
+    return list(dict.fromkeys(paths))
+
+
+@memoize
+def _handler():
+    """The handler gunicorn serves the site with, middleware loaded once"""
+    return WSGIHandler()
+
+
+def render_page(path, site_url=None):
+    """Request one page as an anonymous visitor of the site and return the response"""
+    site = urlsplit(site_url or settings.SITE_URL)
+    # A new cookie-less request per page, so every page is seen by the same anonymous visitor
+    request = RequestFactory(HTTP_HOST=site.netloc).get(path, secure=site.scheme == 'https')
+    return _handler().get_response(request)
+
+
+def warm_page(path, site_url=None):
+    """Request one page as an anonymous visitor; returns (path, status code, seconds)"""
+    started = time.monotonic()
+    status = render_page(path, site_url).status_code
+    return path, status, time.monotonic() - started
+
+
+def _warm_in_thread(path, site_url):
+    try:
+        return warm_page(path, site_url)
+    finally:
+        # Worker threads open their own database connections
+        connections.close_all()
+
+
+def warm_cache(paths=None, site_url=None, threads=1):
+    """Warm the given pages (default: every public page), optionally in parallel threads"""
+    paths = warm_urls() if paths is None else paths
+    if threads <= 1:
+        return [warm_page(path, site_url) for path in paths]
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda path: _warm_in_thread(path, site_url), paths))
@@ -45,6 +45,14 @@ python manage.py migrate
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Inline the first-screen CSS of the main pages
+echo "Building critical CSS..."
+python manage.py build_critical_css || echo "Critical CSS build failed, stylesheets stay blocking"
+
+# Render the content-free pages for nginx
+echo "Building page snapshots..."
+python manage.py build_snapshots
+
 # Run Django checks
 echo "Running Django system checks..."
 python manage.py check
@@ -64,6 +72,10 @@ sleep 5
 echo "Checking service status..."
 sudo supervisorctl status kapadiaschool_group:*
 
+# Fill the page cache before visitors arrive
+echo "Warming the page cache..."
+python manage.py warm_cache --threads 4 || echo "Cache warming failed, pages will be cached on first visit"
+
 # Test application is responding
 echo "Testing application response..."
 response=$(curl -s -o /dev/null -w "%{http_code}" http://localhost:8000/ || echo "000")
@@ -0,0 +1,157 @@
+"""
+Performance budgets for the public site.
+
+Seeds a realistic archive (hundreds of galleries, thousands of gallery
+images and campus photos) and checks the database queries and the HTML
+size of every public route against its budget, so an N+1 loop or a page
+that grows with the archive fails the suite like any functional bug.
+Every named route in khschool/urls.py needs a budget below.
+
+Run with: python manage.py test khschool tests
+"""
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from khschool.caching import public_route_names
+from khschool.models import BranchPhoto, CarouselImage, Celebration, CelebrationPhoto, Gallery, GalleryImage
+from khschool.schema import table_exists
+
+CAMPUSES = [campus for campus, campus_name in BranchPhoto.CAMPUS_CHOICES]
+
+# Route name -> (max queries with a cold cache, max HTML size in KB)
+ROUTE_BUDGETS = {
+    'home': (3, 32),
+    'gallery': (3, 160),
+    'gallery_more': (2, 140),
+    'celebrations': (1, 110),
+    **{campus: (1, 24) for campus in CAMPUSES},
+    **{f'{campus}_gallery': (2, 40) for campus in CAMPUSES},
+    'contact': (0, 20),
+    'brief': (0, 14),
+    'aboutSchool': (0, 24),
+    'about': (0, 24),
+    'admissions': (0, 44),
+    'facilities': (0, 34),
+    'activities': (0, 24),
+    'testimonials': (0, 30),
+    'our_team': (0, 22),
+    'success_stories': (0, 28),
+    'achievements': (0, 30),
+    'blog': (0, 36),
+    'campus_gallery': (0, 16),
+    'carousel': (0, 8),
+    'gallery_new': (0, 24),
+    'institutional_goals': (0, 20),
+    'team': (0, 28),
+    'image_test': (0, 1),  # Login redirect
+}
+
+# Filtered and paginated variants of the routes above
+URL_BUDGETS = {
+    '/gallery/?category=festival': (3, 160),
+    '/gallery/?branch=kadi': (3, 160),
+    '/kadi/photos/?category=classrooms&page=2': (2, 40),
+}
+
+GALLERIES = 300
+IMAGES_PER_GALLERY = 10
+CELEBRATIONS = 60
+PHOTOS_PER_CELEBRATION = 8
+PHOTOS_PER_CAMPUS = 600
+
+
+class PerformanceBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        gallery_categories = [category for category, label in Gallery.CATEGORY_CHOICES]
+        photo_categories = [category for category, label in BranchPhoto.PHOTO_CATEGORY_CHOICES]
+
+        galleries = Gallery.objects.bulk_create([
+            Gallery(
+                name=f'Gallery {index}',
+                category=gallery_categories[index % len(gallery_categories)],
+                campus_branch=CAMPUSES[index % len(CAMPUSES)],
+                is_featured=index < 6,
+                show_on_campus_page=index % 5 == 0,
+            )
+            for index in range(GALLERIES)
+        ])
+        GalleryImage.objects.bulk_create([
+            GalleryImage(
+                gallery=gallery, order=order, title=f'Photo {order}',
+                image_url=f'https://example.com/gallery/{gallery.pk}/{order}.jpg'
+            )
+            for gallery in galleries
+            for order in range(IMAGES_PER_GALLERY)
+        ])
+
+        celebrations = Celebration.objects.bulk_create([
+            Celebration(
+                festivalname=f'Festival {index}', description='A day of music and dance. ' * 5,
+                image_url=f'https://example.com/celebrations/{index}.jpg', date=now, is_featured=index < 4
+            )
+            for index in range(CELEBRATIONS)
+        ])
+        CelebrationPhoto.objects.bulk_create([
+            CelebrationPhoto(
+                celebration=celebration, order=order,
+                photo_url=f'https://example.com/celebrations/{celebration.pk}/{order}.jpg'
+            )
+            for celebration in celebrations
+            for order in range(PHOTOS_PER_CELEBRATION)
+        ])
+
+        BranchPhoto.objects.bulk_create([
+            BranchPhoto(
+                campus_branch=campus, title=f'{campus} photo {index}', order=index,
+                category=photo_categories[index % len(photo_categories)], is_featured=index % 50 == 0,
+                image_url=f'https://example.com/{campus}/{index}.jpg'
+            )
+            for campus in CAMPUSES
+            for index in range(PHOTOS_PER_CAMPUS)
+        ])
+
+        CarouselImage.objects.bulk_create([
+            CarouselImage(title=f'Slide {index}', image_url=f'https://example.com/slides/{index}.jpg', order=index)
+            for index in range(8)
+        ])
+
+        # Budgets are for a running site, which already knows its tables
+        for model in apps.get_app_config('khschool').get_models():
+            table_exists(model)
+
+    def assert_within_budget(self, url, max_queries, max_kb):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertIn(response.status_code, (200, 302))
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{url} ran {len(queries)} queries:\n' + '\n'.join(query['sql'] for query in queries)
+        )
+        self.assertLessEqual(len(response.content), max_kb * 1024, f'{url} is {len(response.content) // 1024} KB')
+
+        # Anonymous repeat visits come from the page cache
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(set(public_route_names()) - set(ROUTE_BUDGETS), set())
+
+    def test_routes_within_budget(self):
+        for name, (max_queries, max_kb) in ROUTE_BUDGETS.items():
+            with self.subTest(route=name):
+                self.assert_within_budget(reverse(name), max_queries, max_kb)
+
+    def test_filtered_pages_within_budget(self):
+        for url, (max_queries, max_kb) in URL_BUDGETS.items():
+            with self.subTest(url=url):
+                self.assert_within_budget(url, max_queries, max_kb)